@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""
+ChatGPT Thread Extractor - Archive Index
+Sidecar index of conversation IDs, byte offsets and lengths for archive files
+"""
+
+import bisect
+import gzip
+import json
+import lzma
+import os
+import re
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:  # Optional; only needed for .zst archives
+    zstandard = None
+
+
+# Sidecar file next to the archive: chatgpt_archive.txt -> chatgpt_archive.txt.idx
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+# Bytes read per chunk when rebuilding the index by scanning the archive
+SCAN_CHUNK_SIZE = 4 << 20
+
+# Bytes copied per read when compacting
+COPY_CHUNK_SIZE = 4 << 20
+
+# Conversations per independently compressed frame in .gz/.xz/.zst archives
+FRAME_ENTRIES = 64
+
+# Where an entry lives in the archive, plus the update_time and content hash
+# of the conversation it was rendered from (None when unknown, e.g. after
+# rebuilding the index by scanning the archive)
+IndexEntry = namedtuple('IndexEntry', 'offset length update_time digest')
+
+# What a truncated or damaged compressed frame can raise while scanning
+_FRAME_ERRORS = (ValueError, EOFError, zlib.error, lzma.LZMAError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+# Last line of every entry written since trailers were added: the crc32 of
+# the entry bytes before it, so a half-written entry left by a killed run
+# can be told from a complete one
+_TRAILER = re.compile(rb'Checksum: ([0-9a-f]{8})\n\n')
+_RULE = b'=' * 80
+
+# Header written by create_archive_entry at the start of every entry
+_ENTRY_HEADER = re.compile(
+    rb'^={80}\r?\nCONVERSATION: [^\n]*\nDate: [^\n]*\nID: ([^\r\n]*)\r?\n',
+    re.MULTILINE
+)
+
+_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_UNESCAPE = re.compile(r'\\(.)')
+_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r'}
+
+
+def _escape(text):
+    """Escape a text field for a tab-separated index row"""
+    return ''.join(_ESCAPES.get(c, c) for c in text) if any(c in _ESCAPES for c in text) else text
+
+
+def _unescape(text):
+    """Reverse _escape"""
+    if '\\' not in text:
+        return text
+    return _UNESCAPE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), text)
+
+
+@contextmanager
+def atomic_write(path, newline=None):
+    """Open a UTF-8 text file that replaces path only once the block completes
+
+    It is written under path + '.tmp' and moved into place with
+    os.replace, so readers see the old file or the new one, never half.
+    """
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline=newline) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def seal_entry(body):
+    """Archive bytes for a rendered entry: the body followed by its checksum trailer"""
+    return body + b'Checksum: %08x\n\n' % zlib.crc32(body)
+
+
+def _trailers(data):
+    """Start of every line of data that could be a checksum trailer, last first"""
+    start = len(data)
+    while True:
+        start = data.rfind(b'\nChecksum: ', 0, start)
+        if start < 0:
+            return
+        yield start + 1
+
+
+def entry_body(data):
+    """An entry's bytes without its checksum trailer, or without the final blank line
+    of an entry written before trailers existed
+    """
+    start = next(_trailers(data), None)
+    if start is not None and _TRAILER.fullmatch(data, start):
+        return data[:start]
+    return data[:-1] if data.endswith(b'\n') else data
+
+
+def complete_length(data, sealed):
+    """Return (length of the complete entry at the start of data or 0, sealed)
+
+    A complete entry ends in a trailer with a matching checksum; entries
+    from before trailers only count until the first sealed one is seen.
+    """
+    for start in _trailers(data):
+        match = _TRAILER.match(data, start)
+        if match and zlib.crc32(data[:start]) == int(match.group(1), 16):
+            return match.end(), True
+    if not sealed and data.rstrip(b'\r\n').endswith(_RULE):
+        return len(data), False
+    return 0, sealed
+
+
+def scan_archive_entries(archive_path, chunk_size=SCAN_CHUNK_SIZE):
+    """Yield (conversation_id, offset, length) for each entry by scanning the archive
+
+    Reads the file in chunks and matches the entry header lines, so memory
+    stays bounded by the chunk size no matter how large the archive is.
+    """
+    size = os.path.getsize(archive_path)
+    previous = None
+    with open(archive_path, 'rb') as f:
+        base = 0  # File offset of buf[0]
+        buf = b''
+        while True:
+            chunk = f.read(chunk_size)
+            buf += chunk
+            carry = len(buf)
+            if chunk:
+                # A header cut off by the chunk boundary starts within the
+                # last four lines; leave those for the next round
+                for _ in range(4):
+                    carry = buf.rfind(b'\n', 0, carry)
+                    if carry < 0:
+                        break
+                carry += 1
+
+            for match in _ENTRY_HEADER.finditer(buf):
+                if match.start() >= carry:
+                    break
+                offset = base + match.start()
+                if previous is not None:
+                    yield previous[0], previous[1], offset - previous[1]
+                previous = (match.group(1).decode('utf-8', 'replace'), offset)
+
+            if not chunk:
+                break
+            base += carry
+            buf = buf[carry:]
+
+    if previous is not None:
+        yield previous[0], previous[1], size - previous[1]
+
+
+# A compressor for archive frames: compress(data) returns one self-contained
+# frame and decompressor() an object whose decompress() stops at the end of
+# a frame, exposing eof and unused_data. Concatenated frames are still a
+# valid .gz/.xz/.zst file, so the usual tools read the whole archive.
+Codec = namedtuple('Codec', 'name compress decompressor')
+
+
+def _zstd_codec():
+    if zstandard is None:
+        raise ValueError("Writing or reading .zst archives needs the zstandard package "
+                         "(pip install zstandard)")
+    return Codec('zstd', zstandard.ZstdCompressor(level=9).compress,
+                 lambda: zstandard.ZstdDecompressor().decompressobj())
+
+
+CODECS = {
+    '.gz': lambda: Codec('gzip', lambda data: gzip.compress(data, 9),
+                         lambda: zlib.decompressobj(zlib.MAX_WBITS | 16)),
+    '.xz': lambda: Codec('xz', lzma.compress, lzma.LZMADecompressor),
+    '.zst': _zstd_codec,
+}
+
+
+def codec_for_path(archive_path):
+    """Codec implied by the archive's extension, or None for a plain text archive"""
+    factory = CODECS.get(os.path.splitext(archive_path)[1].lower())
+    return factory() if factory else None
+
+
+# One compressed frame: where it sits in the file and which range of the
+# uncompressed archive it holds
+Frame = namedtuple('Frame', 'offset length uoffset ulength')
+
+
+def iter_frames(f, codec, chunk_size=SCAN_CHUNK_SIZE):
+    """Yield (offset, length, data) for each compressed frame in f"""
+    offset = 0
+    pending = b''
+    while True:
+        if not pending:
+            pending = f.read(chunk_size)
+            if not pending:
+                return
+        decompressor = codec.decompressor()
+        parts = []
+        length = 0
+        data = pending
+        while True:
+            parts.append(decompressor.decompress(data))
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                length += len(data) - len(pending)
+                break
+            length += len(data)
+            data = f.read(chunk_size)
+            if not data:
+                raise ValueError("Archive ends in the middle of a compressed frame")
+        yield offset, length, b''.join(parts)
+        offset += length
+
+
+def shard_location(archive_path):
+    """(directory, extension) of the shards of a sharded archive
+
+    The directory is the archive path without its extensions, and every
+    shard keeps them: chatgpt_archive.txt.gz -> chatgpt_archive/2024-05.txt.gz
+    """
+    root, extension = os.path.splitext(archive_path)
+    if extension.lower() in CODECS:
+        root, inner = os.path.splitext(root)
+        extension = inner + extension
+    return root, extension or '.txt'
+
+
+def list_shards(directory):
+    """Paths of the shard archives in a sharded archive directory, sorted by name"""
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith('.') or name.endswith((INDEX_SUFFIX, '.tmp')):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+
+def _format_optional(value):
+    """TSV field for an optional value; '' stands for None"""
+    return '' if value is None else _escape(str(value))
+
+
+class ArchiveIndex:
+    """Sidecar index mapping conversation IDs to entry byte ranges in an archive
+
+    A stale index (archive size or mtime changed) is rebuilt by scanning.
+    Re-appended IDs point at their newest entry, leaving tombstones for
+    compact(); compressed archives also keep a frame table.
+    """
+
+    COLUMNS = ['id', 'offset', 'length', 'update_time', 'hash']
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.path = archive_path + INDEX_SUFFIX
+        self.codec = codec_for_path(archive_path)
+        self.entries = {}  # conversation_id -> IndexEntry
+        self.frames = []  # Frame for each compressed frame, in file order
+        self.complete_size = None  # File size up to the last complete entry, if known
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def ids(self):
+        """Set of conversation IDs present in the archive"""
+        return set(self.entries)
+
+    def get(self, conversation_id):
+        """IndexEntry of the live entry for an ID, or None"""
+        return self.entries.get(conversation_id)
+
+    def add(self, conversation_id, offset, length, update_time=None, digest=None):
+        """Record an entry written at offset, superseding any earlier entry for the ID"""
+        self.entries[conversation_id] = IndexEntry(offset, length, update_time, digest)
+
+    def set_source(self, conversation_id, update_time, digest):
+        """Record the update_time and content hash behind an existing entry"""
+        self.entries[conversation_id] = self.entries[conversation_id]._replace(
+            update_time=update_time, digest=digest)
+
+    def add_frame(self, offset, length, ulength):
+        """Record a compressed frame appended at offset"""
+        self.frames.append(Frame(offset, length, self.text_size(), ulength))
+
+    def text_size(self):
+        """Size of the archive's uncompressed text"""
+        if self.codec is None:
+            return os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0
+        return self.frames[-1].uoffset + self.frames[-1].ulength if self.frames else 0
+
+    def dead_bytes(self):
+        """Uncompressed bytes of the archive taken up by tombstoned entries"""
+        live = sum(entry.length for entry in self.entries.values())
+        return self.text_size() - live
+
+    def iter_entries(self, conversation_ids):
+        """Yield (conversation_id, entry bytes) for the IDs present, in archive order
+
+        Plain archives cost one seek and one read per entry; compressed
+        ones decompress each frame holding a wanted entry once. Entries
+        are read front to back so a batch sweeps the archive once.
+        """
+        wanted = sorted((cid for cid in set(conversation_ids) if cid in self.entries),
+                        key=lambda cid: self.entries[cid].offset)
+        starts = [frame.uoffset for frame in self.frames]
+        frame = text = None
+        with open(self.archive_path, 'rb') as f:
+            for conversation_id in wanted:
+                offset, length = self.entries[conversation_id][:2]
+                if self.codec is None:
+                    f.seek(offset)
+                    yield conversation_id, f.read(length)
+                    continue
+                number = bisect.bisect_right(starts, offset) - 1
+                if number != frame:
+                    frame = number
+                    f.seek(self.frames[frame].offset)
+                    text = self.codec.decompressor().decompress(f.read(self.frames[frame].length))
+                start = offset - self.frames[frame].uoffset
+                yield conversation_id, text[start:start + length]
+
+    def read_entries(self, conversation_ids):
+        """Yield (conversation_id, entry bytes or None) for each requested ID, in request order"""
+        conversation_ids = list(conversation_ids)
+        found = dict(self.iter_entries(conversation_ids))
+        for conversation_id in conversation_ids:
+            yield conversation_id, found.get(conversation_id)
+
+    def read_entry(self, conversation_id):
+        """Return one entry's bytes, or None if the ID is not in the archive"""
+        return next(self.read_entries([conversation_id]))[1]
+
+    @classmethod
+    def load(cls, archive_path, log=print, save=True):
+        """Load the index for archive_path, rebuilding it if missing or stale
+
+        With save unset, a rebuilt index is only kept in memory, for
+        readers that must not write next to the archive.
+        """
+        index = cls(archive_path)
+        if not os.path.exists(archive_path):
+            return index
+        if index._read():
+            return index
+
+        log(f"Rebuilding archive index {index.path}")
+        index.rebuild()
+        if save:
+            index.save()
+        return index
+
+    def _stamp(self):
+        """Archive (size, mtime_ns) used to detect a stale index"""
+        st = os.stat(self.archive_path)
+        return st.st_size, st.st_mtime_ns
+
+    def _read(self):
+        """Read the sidecar file; False if it is missing, unreadable or stale"""
+        try:
+            with open(self.path, 'r', encoding='utf-8', newline='\n') as f:
+                header = json.loads(f.readline().lstrip('#'))
+                if header.get('version') != INDEX_VERSION:
+                    return False
+                if (header.get('size'), header.get('mtime_ns')) != self._stamp():
+                    return False
+                frames = [Frame(*frame) for frame in header.get('frames', [])]
+                columns = header.get('columns', self.COLUMNS)
+                id_col = columns.index('id')
+                offset_col = columns.index('offset')
+                length_col = columns.index('length')
+                # Indexes written before updates were supported lack these
+                time_col = columns.index('update_time') if 'update_time' in columns else None
+                hash_col = columns.index('hash') if 'hash' in columns else None
+
+                entries = {}
+                for line in f:
+                    row = line.rstrip('\n').split('\t')
+                    update_time = row[time_col] if time_col is not None else ''
+                    digest = _unescape(row[hash_col]) if hash_col is not None else ''
+                    entries[_unescape(row[id_col])] = IndexEntry(
+                        int(row[offset_col]), int(row[length_col]),
+                        float(update_time) if update_time else None, digest or None)
+        except (OSError, ValueError, IndexError):
+            return False
+
+        self.entries = entries
+        self.frames = frames
+        # Set when a rebuild found a torn tail that no append has dropped yet
+        self.complete_size = header.get('complete_size', header['size'])
+        return True
+
+    def rebuild(self):
+        """Rebuild the index with a streaming scan of the archive
+
+        Every entry is checked with complete_length(), so one cut short by a
+        killed run is left out (and written again by the next append), and
+        complete_size marks where the last complete entry or frame ends.
+        """
+        self.entries = {}
+        self.frames = []
+        self.complete_size = 0
+        sealed = False
+        if self.codec is None:
+            with open(self.archive_path, 'rb') as f:
+                for conversation_id, offset, length in scan_archive_entries(self.archive_path):
+                    f.seek(offset)
+                    length, sealed = complete_length(f.read(length), sealed)
+                    if length:
+                        self.add(conversation_id, offset, length)
+                        self.complete_size = offset + length
+            return
+
+        # Entries never span frames, so each frame is scanned on its own
+        with open(self.archive_path, 'rb') as f:
+            try:
+                for offset, length, text in iter_frames(f, self.codec):
+                    base = self.text_size()
+                    self.add_frame(offset, length, len(text))
+                    self.complete_size = offset + length
+                    matches = list(_ENTRY_HEADER.finditer(text))
+                    for match, following in zip(matches, matches[1:] + [None]):
+                        end = following.start() if following else len(text)
+                        data = text[match.start():end]
+                        complete, sealed = complete_length(data, sealed)
+                        if complete:
+                            self.add(match.group(1).decode('utf-8', 'replace'),
+                                     base + match.start(), complete)
+            except _FRAME_ERRORS:
+                pass  # A frame cut off by a killed run; complete_size stops before it
+
+    def drop_incomplete(self):
+        """Truncate the archive after its last complete entry and return the bytes dropped
+
+        Only does anything after rebuild() found a half-written entry or
+        frame at the end of the file, so appends start on a clean boundary.
+        """
+        if self.complete_size is None or not os.path.exists(self.archive_path):
+            return 0
+        dropped = os.path.getsize(self.archive_path) - self.complete_size
+        if dropped > 0:
+            os.truncate(self.archive_path, self.complete_size)
+        self.complete_size = None
+        return max(dropped, 0)
+
+    def save(self):
+        """Write the sidecar file atomically, stamped with the archive's current size and mtime"""
+        size, mtime_ns = self._stamp()
+        header = {'version': INDEX_VERSION, 'size': size, 'mtime_ns': mtime_ns,
+                  'columns': self.COLUMNS}
+        if self.complete_size is not None and self.complete_size < size:
+            # A torn tail a reader found; the next append truncates it
+            header['complete_size'] = self.complete_size
+        if self.codec is not None:
+            header['codec'] = self.codec.name
+            header['frames'] = [list(frame) for frame in self.frames]
+        with atomic_write(self.path, newline='\n') as f:
+            f.write('#' + json.dumps(header) + '\n')
+            for conversation_id, entry in self.entries.items():
+                f.write(f"{_escape(conversation_id)}\t{entry.offset}\t{entry.length}\t"
+                        f"{_format_optional(entry.update_time)}\t{_format_optional(entry.digest)}\n")
+
+    def compact(self, chunk_size=COPY_CHUNK_SIZE):
+        """Rewrite the archive with only live entries and return the bytes reclaimed
+
+        Live byte ranges are copied as-is in one pass into a temporary file
+        that replaces the archive.
+        """
+        old_size = os.path.getsize(self.archive_path)
+        tmp_path = self.archive_path + '.compact.tmp'
+        if self.codec is not None:
+            return self._compact_frames(tmp_path, old_size)
+
+        live = sorted(self.entries.items(), key=lambda item: item[1].offset)
+        moved = {}
+        try:
+            with open(self.archive_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                run_start = run_end = None  # Source range of the current run
+                for conversation_id, entry in live:
+                    if entry.offset != run_end:
+                        if run_start is not None:
+                            _copy_range(src, dst, run_start, run_end - run_start, chunk_size)
+                        run_start = run_end = entry.offset
+                        run_dst = dst.tell()
+                    moved[conversation_id] = entry._replace(offset=run_dst + entry.offset - run_start)
+                    run_end = entry.offset + entry.length
+                if run_start is not None:
+                    _copy_range(src, dst, run_start, run_end - run_start, chunk_size)
+            os.replace(tmp_path, self.archive_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.entries = {cid: moved[cid] for cid in self.entries}
+        self.complete_size = None
+        self.save()
+        return old_size - os.path.getsize(self.archive_path)
+
+    def _compact_frames(self, tmp_path, old_size):
+        """compact() for compressed archives: live entries are repacked into fresh frames"""
+        compacted = ArchiveIndex(self.archive_path)
+        try:
+            with ArchiveWriter(compacted, 'wb', path=tmp_path) as writer:
+                for conversation_id, data in self.iter_entries(list(self.entries)):
+                    entry = self.entries[conversation_id]
+                    writer.write(conversation_id, data, entry.update_time, entry.digest)
+            os.replace(tmp_path, self.archive_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.entries = {cid: compacted.entries[cid] for cid in self.entries}
+        self.frames = compacted.frames
+        self.complete_size = None
+        self.save()
+        return old_size - os.path.getsize(self.archive_path)
+
+
+class ArchiveWriter:
+    """Append entries to an archive and keep its index in step
+
+    Compressed archives are written in frames of frame_entries entries.
+    mode 'wb' starts afresh; path overrides the file written.
+    """
+
+    def __init__(self, index, mode='ab', frame_entries=FRAME_ENTRIES, path=None):
+        self.index = index
+        self.codec = index.codec
+        self.frame_entries = frame_entries
+        if mode == 'wb':
+            index.entries = {}
+            index.frames = []
+        # Callers drop a torn tail first (drop_incomplete), so all that is
+        # written from here on is complete
+        index.complete_size = None
+        self.text_offset = index.text_size() if mode == 'ab' else 0
+        self.f = open(path or index.archive_path, mode)
+        self.f.seek(0, os.SEEK_END)
+        self.buffer = []
+
+    def write(self, conversation_id, data, update_time=None, digest=None):
+        """Append one rendered entry"""
+        self.index.add(conversation_id, self.text_offset, len(data), update_time, digest)
+        self.text_offset += len(data)
+        if self.codec is None:
+            self.f.write(data)
+            return
+        self.buffer.append(data)
+        if len(self.buffer) >= self.frame_entries:
+            self.flush_frame()
+
+    def flush_frame(self):
+        """Compress buffered entries into one frame"""
+        if not self.buffer:
+            return
+        text = b''.join(self.buffer)
+        frame = self.codec.compress(text)
+        self.index.add_frame(self.f.tell(), len(frame), len(text))
+        self.f.write(frame)
+        self.buffer = []
+
+    def close(self):
+        if self.codec is not None:
+            self.flush_frame()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _copy_range(src, dst, offset, length, chunk_size=COPY_CHUNK_SIZE):
+    """Copy length bytes from offset in src to the current position of dst"""
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            raise ValueError("Archive is shorter than its index")
+        dst.write(chunk)
+        length -= len(chunk)
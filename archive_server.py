@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+ChatGPT Thread Extractor - Query Server
+Read-only local HTTP service over an archive or an individual files output directory
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from archive_index import ArchiveIndex, entry_body, list_shards
+
+
+# Bytes of rendered conversations kept in memory between requests
+DEFAULT_CACHE_BYTES = 64 << 20
+
+# Bytes read from the start of each archive entry to find its title and date
+HEADER_READ_SIZE = 1024
+
+DEFAULT_LIST_LIMIT = 100
+DEFAULT_SEARCH_LIMIT = 20
+SNIPPET_CONTEXT = 80
+
+# Title and date lines of the header create_archive_entry writes
+_HEADER_FIELDS = re.compile(rb'CONVERSATION: ([^\r\n]*)\r?\nDate: ([^\r\n]*)\r?\n')
+
+# What a listing shows for one conversation; created is a Unix timestamp or None
+ConversationInfo = namedtuple('ConversationInfo', 'id title created')
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache of bytes values, bounded by their total size"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache value, evicting the least recently used ones to stay within max_bytes"""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._items), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def _parse_header(data):
+    """(title, created timestamp) from the start of an archive entry"""
+    match = _HEADER_FIELDS.search(data)
+    if not match:
+        return None, None
+    title = match.group(1).decode('utf-8', 'replace')
+    try:
+        created = datetime.fromisoformat(match.group(2).decode('ascii')).timestamp()
+    except (UnicodeDecodeError, ValueError):
+        created = None
+    return title, created
+
+
+class ArchiveStore:
+    """Conversations of an archive, or of every shard of a sharded archive
+
+    Titles and dates are read from the entry headers once; stale indexes
+    are rebuilt in memory only, never saved.
+    """
+
+    def __init__(self, path, log=print):
+        self.path = path
+        paths = list_shards(path) if os.path.isdir(path) else [path]
+        self.indexes = [ArchiveIndex.load(shard, log, save=False) for shard in paths]
+        self.owner = {}  # conversation_id -> ArchiveIndex
+        conversations = []
+        for index in self.indexes:
+            for conversation_id in index.ids():
+                self.owner[conversation_id] = index
+            conversations.extend(self._scan(index))
+        conversations.sort(key=lambda info: info.created or 0, reverse=True)
+        self.conversations = conversations
+
+    def _scan(self, index):
+        """ConversationInfo for every entry of one archive, in archive order"""
+        if index.codec is not None:
+            for conversation_id, data in index.iter_entries(index.ids()):
+                yield ConversationInfo(conversation_id, *_parse_header(data[:HEADER_READ_SIZE]))
+            return
+        live = sorted(index.entries.items(), key=lambda item: item[1].offset)
+        with open(index.archive_path, 'rb') as f:
+            for conversation_id, entry in live:
+                f.seek(entry.offset)
+                data = f.read(min(entry.length, HEADER_READ_SIZE))
+                yield ConversationInfo(conversation_id, *_parse_header(data))
+
+    def read(self, conversation_id):
+        """The conversation's archive entry without its checksum trailer, or None"""
+        index = self.owner.get(conversation_id)
+        data = index.read_entry(conversation_id) if index is not None else None
+        return entry_body(data) if data is not None else None
+
+    def scan(self):
+        """Yield (conversation_id, entry) for every conversation in one pass over each archive"""
+        for index in self.indexes:
+            ids = [conversation_id for conversation_id in index.ids()
+                   if self.owner[conversation_id] is index]
+            for conversation_id, data in index.iter_entries(ids):
+                yield conversation_id, entry_body(data)
+
+
+class DirectoryStore:
+    """Conversations of an individual files output directory, found through its manifest
+
+    manifest is {conversation_id: {'file', 'title', 'create_time', ...}}
+    with file paths relative to output_dir.
+    """
+
+    def __init__(self, output_dir, manifest):
+        self.path = output_dir
+        self.files = {conversation_id: entry['file'] for conversation_id, entry in manifest.items()
+                      if entry.get('file')}
+        self.conversations = sorted(
+            (ConversationInfo(conversation_id, entry.get('title'), entry.get('create_time'))
+             for conversation_id, entry in manifest.items() if conversation_id in self.files),
+            key=lambda info: info.created or 0, reverse=True)
+
+    def read(self, conversation_id):
+        """The conversation's file contents, or None"""
+        filename = self.files.get(conversation_id)
+        if filename is None:
+            return None
+        try:
+            with open(os.path.join(self.path, filename), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def scan(self):
+        """Yield (conversation_id, contents) for every conversation, newest first"""
+        for info in self.conversations:
+            data = self.read(info.id)
+            if data is not None:
+                yield info.id, data
+
+
+class QueryServer(ThreadingHTTPServer):
+    """HTTP server answering list, fetch and search requests from a store
+
+    Fetches go through cache; search uses db's FTS5 index when given and
+    otherwise scans the store. parse_time(value, end=False) reads since/until.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, store, cache, parse_time, db=None, log=print):
+        super().__init__(address, QueryHandler)
+        self.store = store
+        self.cache = cache
+        self.parse_time = parse_time
+        self.db = db
+        self.log = log
+        self._db_lock = threading.Lock()
+        self.info = {info.id: info for info in store.conversations}
+
+    def fetch(self, conversation_id):
+        """A conversation's text as bytes, from the cache or the store; None if unknown"""
+        data = self.cache.get(conversation_id)
+        if data is None:
+            data = self.store.read(conversation_id)
+            if data is not None:
+                self.cache.put(conversation_id, data)
+        return data
+
+    def list_conversations(self, params):
+        since = params.get('since')
+        until = params.get('until')
+        since = self.parse_time(since) if since else None
+        until = self.parse_time(until, end=True) if until else None
+        title = re.compile(params['title'], re.IGNORECASE) if params.get('title') else None
+        limit = int(params.get('limit', DEFAULT_LIST_LIMIT))
+        offset = int(params.get('offset', 0))
+
+        matches = [info for info in self.store.conversations
+                   if (since is None or (info.created or 0) >= since)
+                   and (until is None or (info.created or 0) < until)
+                   and (title is None or title.search(info.title or ''))]
+        return {'total': len(matches),
+                'conversations': [_info_dict(info) for info in matches[offset:offset + limit]]}
+
+    def search(self, params):
+        query = params.get('q', '').strip()
+        if not query:
+            raise ValueError("Missing search query (q=...)")
+        limit = int(params.get('limit', DEFAULT_SEARCH_LIMIT))
+        if self.db is not None:
+            with self._db_lock:
+                rows = self.db.search(query, limit)
+            results = [dict(_info_dict(self.info.get(conversation_id)
+                                       or ConversationInfo(conversation_id, title, create_time)),
+                            role=role, snippet=' '.join(snippet.split()))
+                       for conversation_id, title, create_time, role, snippet in rows]
+        else:
+            results = []
+            needle = query.lower()
+            for conversation_id, data in self.store.scan():
+                text = data.decode('utf-8', 'replace')
+                found = text.lower().find(needle)
+                if found < 0:
+                    continue
+                snippet = text[max(0, found - SNIPPET_CONTEXT):found + len(query) + SNIPPET_CONTEXT]
+                results.append(dict(_info_dict(self.info[conversation_id]),
+                                    snippet=' '.join(snippet.split())))
+                if len(results) >= limit:
+                    break
+        return {'query': query, 'results': results}
+
+    def summary(self):
+        return {
+            'source': self.store.path,
+            'conversations': len(self.store.conversations),
+            'search': 'fts5' if self.db is not None else 'scan',
+            'cache': self.cache.stats(),
+            'endpoints': ['/conversations?since=&until=&title=&limit=&offset=',
+                          '/conversations/ID', '/search?q=&limit='],
+        }
+
+
+def _info_dict(info):
+    created = datetime.fromtimestamp(info.created).isoformat() if info.created else None
+    return {'id': info.id, 'title': info.title, 'created': created}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET-only request handler for QueryServer"""
+
+    server_version = 'ChatGPTExtractor'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        try:
+            if path == '/':
+                self._send_json(self.server.summary())
+            elif path == '/conversations':
+                self._send_json(self.server.list_conversations(params))
+            elif path.startswith('/conversations/'):
+                conversation_id = unquote(path[len('/conversations/'):])
+                data = self.server.fetch(conversation_id)
+                if data is None:
+                    self._send_json({'error': f"No conversation {conversation_id}"}, 404)
+                else:
+                    self._send(data, 'text/plain; charset=utf-8')
+            elif path == '/search':
+                self._send_json(self.server.search(params))
+            else:
+                self._send_json({'error': f"Unknown endpoint {path}"}, 404)
+        except (ValueError, re.error, sqlite3.Error) as e:
+            self._send_json({'error': str(e)}, 400)
+
+    def _send_json(self, data, status=200):
+        self._send(json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                   'application/json; charset=utf-8', status)
+
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.log(f"{self.address_string()} {format % args}")
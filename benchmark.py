@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+ChatGPT Thread Extractor - Benchmark Suite
+Generates synthetic conversations.json exports and times each extraction stage
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from archive_index import ArchiveIndex
+from extractor import (DEFAULT_IO_THREADS, ArchiveSink, IndividualFilesSink,
+                       extract_conversation_text, iter_export, iter_messages, run_pipeline)
+
+
+DEFAULT_SCALES = [1000, 10000]
+FULL_SCALES = [1000, 10000, 50000, 200000]
+
+_WORDS = ('the model context token archive thread export message reply branch '
+          'python stream index offset render write parse memory disk cache').split()
+
+
+def _random_text(rng, size):
+    """Roughly size characters of word salad, with the odd non-ASCII character"""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        if rng.random() < 0.02:
+            word += 'é'
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def generate_conversation(rng, index, depth=20, branch_factor=1, message_size=400):
+    """Build one synthetic conversation shaped like a ChatGPT export entry
+
+    depth is the number of messages on the active thread; each assistant
+    turn gets branch_factor - 1 extra regenerated replies hanging off the
+    same parent, like the alternatives the ChatGPT UI keeps.
+    """
+    create_time = 1.6e9 + index * 600 + rng.random() * 60
+    clock = create_time
+    node_count = [0]
+
+    def new_id():
+        node_count[0] += 1
+        return f"{index:08x}-{node_count[0]:04x}-{rng.getrandbits(48):012x}"
+
+    def message_node(node_id, parent, role, when):
+        size = max(1, int(message_size * rng.uniform(0.5, 1.5)))
+        message = {
+            'id': node_id,
+            'author': {'role': role, 'name': None, 'metadata': {}},
+            'create_time': when,
+            'update_time': None,
+            'content': {'content_type': 'text', 'parts': [_random_text(rng, size)]},
+            'status': 'finished_successfully',
+            'end_turn': role == 'assistant',
+            'weight': 1.0,
+            'metadata': {'model_slug': 'gpt-4o'} if role == 'assistant' else {},
+            'recipient': 'all',
+        }
+        return {'id': node_id, 'message': message, 'parent': parent, 'children': []}
+
+    root = new_id()
+    mapping = {root: {'id': root, 'message': None, 'parent': None, 'children': []}}
+    parent = root
+    for turn in range(depth):
+        role = 'user' if turn % 2 == 0 else 'assistant'
+        clock += rng.uniform(5, 120)
+        if role == 'assistant':
+            for _ in range(branch_factor - 1):
+                alt = new_id()
+                mapping[alt] = message_node(alt, parent, role, clock)
+                mapping[parent]['children'].append(alt)
+        node_id = new_id()
+        mapping[node_id] = message_node(node_id, parent, role, clock)
+        mapping[parent]['children'].append(node_id)
+        parent = node_id
+
+    return {
+        'title': f"Synthetic conversation {index}: {_random_text(rng, 30)}",
+        'create_time': create_time,
+        'update_time': clock,
+        'mapping': mapping,
+        'moderation_results': [],
+        'current_node': parent,
+        'plugin_ids': None,
+        'conversation_id': root,
+        'default_model_slug': 'gpt-4o',
+        'id': root,
+    }
+
+
+def write_synthetic_export(path, count, depth=20, branch_factor=1, message_size=400,
+                           layout='list', seed=0):
+    """Write a synthetic export of count conversations, streaming so memory stays flat"""
+    rng = random.Random(seed)
+    opener, closer = ('[', ']') if layout == 'list' else ('{', '}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(opener)
+        for i in range(count):
+            if i:
+                f.write(', ')
+            conversation = generate_conversation(rng, i, depth, branch_factor, message_size)
+            if layout == 'dict':
+                f.write(json.dumps(conversation['id']) + ': ')
+            f.write(json.dumps(conversation, ensure_ascii=False))
+        f.write(closer)
+    return os.path.getsize(path)
+
+
+def _timed(func, *args, **kwargs):
+    """Run func and return (result, {'wall': seconds, 'cpu': seconds})"""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    result = func(*args, **kwargs)
+    return result, {'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu}
+
+
+def _time_parse_traverse_render(input_file):
+    """Stream the export once, timing parse, traversal and rendering separately"""
+    stages = {name: {'wall': 0.0, 'cpu': 0.0} for name in ('load', 'traverse', 'render')}
+    count = 0
+
+    def add(name, wall, cpu):
+        stages[name]['wall'] += time.perf_counter() - wall
+        stages[name]['cpu'] += time.process_time() - cpu
+
+    conversations = iter_export(input_file)
+    while True:
+        wall, cpu = time.perf_counter(), time.process_time()
+        item = next(conversations, None)
+        add('load', wall, cpu)
+        if item is None:
+            break
+        count += 1
+        conversation = item[1]
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in iter_messages(conversation):
+            pass
+        add('traverse', wall, cpu)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        extract_conversation_text(conversation)
+        add('render', wall, cpu)
+
+    return count, stages
+
+
+def benchmark_scale(count, workdir, depth=20, branch_factor=1, message_size=400,
+                    layout='list', workers=1, seed=0, io_threads=DEFAULT_IO_THREADS, log=print):
+    """Generate one synthetic export and time every stage against it"""
+    input_file = os.path.join(workdir, f"conversations_{count}.json")
+    input_bytes, generate = _timed(write_synthetic_export, input_file, count, depth,
+                                   branch_factor, message_size, layout, seed)
+    log(f"  generated {input_bytes / 1e6:.1f} MB in {generate['wall']:.2f}s")
+
+    parsed, stages = _time_parse_traverse_render(input_file)
+
+    def pipeline(sink):
+        conversations = iter_export(input_file, with_source=True)
+        return run_pipeline(conversations, [sink], workers=workers, log=lambda message: None)
+
+    output_dir = os.path.join(workdir, f"individual_{count}")
+    _, stages['write_individual'] = _timed(pipeline,
+                                         IndividualFilesSink(output_dir, io_threads=io_threads))
+
+    archive_path = os.path.join(workdir, f"archive_{count}.txt")
+    _, stages['write_archive'] = _timed(pipeline, ArchiveSink(archive_path, append=False))
+
+    # Dedupe against an existing archive: sidecar index fast path, then a
+    # full rescan as when the index is missing or stale
+    _, stages['archive_dedupe'] = _timed(ArchiveIndex.load, archive_path, lambda message: None)
+    index = ArchiveIndex(archive_path)
+    _, stages['archive_rescan'] = _timed(index.rebuild)
+    _, stages['archive_append_noop'] = _timed(pipeline, ArchiveSink(archive_path, append=True))
+
+    for name, timing in stages.items():
+        timing['conversations_per_sec'] = parsed / timing['wall'] if timing['wall'] else None
+        log(f"  {name:<20} {timing['wall']:8.3f}s wall {timing['cpu']:8.3f}s cpu "
+            f"{timing['conversations_per_sec'] or 0:12.0f} conv/s")
+
+    return {
+        'conversations': parsed,
+        'input_bytes': input_bytes,
+        'archive_bytes': os.path.getsize(archive_path),
+        'stages': stages,
+    }
+
+
+def _git_commit():
+    """Current commit of the checkout, if it is a git repository"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline):
+    """Print the wall-time ratio of every stage against a baseline results file"""
+    base_scales = {run['conversations']: run for run in baseline.get('runs', [])}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} (ratio > 1.00 is slower):")
+    for run in results['runs']:
+        base = base_scales.get(run['conversations'])
+        if not base:
+            continue
+        print(f"  {run['conversations']} conversations")
+        for name, timing in run['stages'].items():
+            base_timing = base['stages'].get(name)
+            if base_timing and base_timing['wall']:
+                print(f"    {name:<20} {timing['wall'] / base_timing['wall']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the extractor against synthetic conversations.json exports',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Quick run at 1k and 10k conversations
+  %(prog)s --output bench.json
+
+  # Full run from 1k to 200k conversations, compared with an earlier result
+  %(prog)s --full --output bench.json --compare bench_baseline.json
+
+  # Deep, branchy threads in dict layout
+  %(prog)s --scales 5000 --depth 200 --branch-factor 3 --layout dict
+        """
+    )
+    parser.add_argument('--scales', default=','.join(str(n) for n in DEFAULT_SCALES),
+                        help='Comma-separated conversation counts (default: 1000,10000)')
+    parser.add_argument('--full', action='store_true',
+                        help='Run every scale from 1k to 200k conversations')
+    parser.add_argument('--depth', type=int, default=20,
+                        help='Messages on the active thread of each conversation (default: 20)')
+    parser.add_argument('--branch-factor', type=int, default=1,
+                        help='Replies per assistant turn, counting regenerations (default: 1)')
+    parser.add_argument('--message-size', type=int, default=400,
+                        help='Average characters per message (default: 400)')
+    parser.add_argument('--layout', choices=['list', 'dict'], default='list',
+                        help='Top-level JSON layout of the export (default: list)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for the write stages (default: 1)')
+    parser.add_argument('--io-threads', type=int, default=DEFAULT_IO_THREADS,
+                        help=f'Threads writing individual files (default: {DEFAULT_IO_THREADS})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', '-o', help='Write results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Compare with an earlier results JSON file')
+    parser.add_argument('--workdir', help='Directory for generated files (default: a temp dir)')
+    parser.add_argument('--keep', action='store_true', help='Keep generated files')
+
+    args = parser.parse_args()
+    scales = FULL_SCALES if args.full else [int(n) for n in args.scales.split(',') if n]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='extractor_bench_')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {
+            'depth': args.depth,
+            'branch_factor': args.branch_factor,
+            'message_size': args.message_size,
+            'layout': args.layout,
+            'workers': args.workers,
+            'io_threads': args.io_threads,
+            'seed': args.seed,
+        },
+        'runs': [],
+    }
+
+    try:
+        for count in scales:
+            print(f"Benchmarking {count} conversations")
+            scale_dir = os.path.join(workdir, f"scale_{count}")
+            os.makedirs(scale_dir, exist_ok=True)
+            run = benchmark_scale(count, scale_dir, args.depth, args.branch_factor,
+                                  args.message_size, args.layout, args.workers, args.seed,
+                                  args.io_threads)
+            results['runs'].append(run)
+            if not args.keep:
+                shutil.rmtree(scale_dir, ignore_errors=True)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(results, json.load(f))
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
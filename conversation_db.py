@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+ChatGPT Thread Extractor - Conversation Database
+SQLite store of conversations and messages with FTS5 full-text search
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    create_time REAL,
+    update_time REAL,
+    model TEXT,
+    hash TEXT,
+    message_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id),
+    position INTEGER NOT NULL,
+    role TEXT,
+    create_time REAL,
+    model TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages(conversation_id, position);
+"""
+
+# External-content FTS5 table over messages.text, kept in step by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+_UPSERT_CONVERSATION = """
+INSERT INTO conversations (id, title, create_time, update_time, model, hash, message_count)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    title = excluded.title, create_time = excluded.create_time,
+    update_time = excluded.update_time, model = excluded.model,
+    hash = excluded.hash, message_count = excluded.message_count
+"""
+
+_INSERT_MESSAGE = """
+INSERT INTO messages (conversation_id, position, role, create_time, model, text)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_SEARCH = """
+SELECT c.id, c.title, c.create_time, m.role,
+       snippet(messages_fts, 0, '[', ']', '...', 16)
+FROM messages_fts
+JOIN messages m ON m.id = messages_fts.rowid
+JOIN conversations c ON c.id = m.conversation_id
+WHERE messages_fts MATCH ?
+ORDER BY rank
+LIMIT ?
+"""
+
+
+class ConversationDB:
+    """SQLite database of conversations and their messages
+
+    upsert() writes a batch in one transaction. read_only opens an existing
+    database without changing it, shareable across threads one at a time.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        if read_only:
+            uri = Path(path).resolve().as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.has_fts = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone() is not None
+            return
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+
+    def versions(self):
+        """{conversation_id: (update_time, hash)} for every stored conversation"""
+        rows = self.conn.execute("SELECT id, update_time, hash FROM conversations")
+        return {conversation_id: (update_time, digest) for conversation_id, update_time, digest in rows}
+
+    def upsert(self, conversations, messages):
+        """Insert or replace a batch of conversations in one transaction
+
+        conversations holds (id, title, create_time, update_time, model,
+        hash, message_count) rows and messages (conversation_id, position,
+        role, create_time, model, text) rows for the same conversations.
+        """
+        with self.conn:
+            self.conn.executemany("DELETE FROM messages WHERE conversation_id = ?",
+                                  [(row[0],) for row in conversations])
+            self.conn.executemany(_UPSERT_CONVERSATION, conversations)
+            self.conn.executemany(_INSERT_MESSAGE, messages)
+
+    def search(self, query, limit=20):
+        """Full-text search of message text; (id, title, create_time, role, snippet) rows, best first"""
+        if not self.has_fts:
+            raise ValueError(f"{self.path}: this SQLite build has no FTS5 support")
+        return self.conn.execute(_SEARCH, (query, limit)).fetchall()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+ChatGPT Thread Extractor - Export Cache
+Sidecar cache of per-conversation metadata and byte spans for an export
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from archive_index import atomic_write
+
+
+# Sidecar file next to the export: conversations.json -> conversations.json.cache
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 2
+
+# Bytes hashed from each end of the export for the fast content check
+HASH_SAMPLE_SIZE = 1 << 20
+
+# What the cache knows about one conversation: its byte range and content
+# hash in the export, the top-level fields filters look at, and its message
+# counts on the active thread and across all branches
+ConversationMeta = namedtuple(
+    'ConversationMeta',
+    'id start end digest title create_time update_time model messages messages_all'
+)
+
+
+def fast_hash(path, sample_size=HASH_SAMPLE_SIZE):
+    """sha1 of the file size and its first and last sample_size bytes
+
+    Cheap enough to run on every start, and catches an export that was
+    replaced by a different one of the same size and mtime.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """Per-conversation metadata for an export, in file order
+
+    The cache records the export's size, mtime and fast_hash when it was
+    saved. It is valid if the size matches and either the mtime or the
+    hash does, so a copied or touched export keeps its cache.
+    """
+
+    COLUMNS = list(ConversationMeta._fields)
+
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.path = input_file + CACHE_SUFFIX
+        self.entries = []
+        self.stamp = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def add(self, meta):
+        """Append the metadata of the next conversation in the export"""
+        self.entries.append(meta)
+
+    @classmethod
+    def load(cls, input_file):
+        """Load the cache for input_file, or None if it is missing or stale"""
+        cache = cls(input_file)
+        return cache if cache._read() else None
+
+    def take_stamp(self):
+        """Record the export's (size, mtime_ns, fast hash) to save with the cache"""
+        st = os.stat(self.input_file)
+        self.stamp = (st.st_size, st.st_mtime_ns, fast_hash(self.input_file))
+        return self.stamp
+
+    def _read(self):
+        """Read the sidecar file; False if it is missing, unreadable or stale"""
+        try:
+            with open(self.path, 'r', encoding='utf-8', newline='\n') as f:
+                header = json.loads(f.readline().lstrip('#'))
+                if header.get('version') != CACHE_VERSION or header.get('columns') != self.COLUMNS:
+                    return False
+                st = os.stat(self.input_file)
+                if header.get('size') != st.st_size:
+                    return False
+                if (header.get('mtime_ns') != st.st_mtime_ns
+                        and header.get('hash') != fast_hash(self.input_file)):
+                    return False
+                entries = [ConversationMeta(*json.loads(line)) for line in f]
+        except (OSError, ValueError, TypeError):
+            return False
+
+        self.entries = entries
+        self.stamp = (header['size'], header['mtime_ns'], header.get('hash'))
+        return True
+
+    def save(self):
+        """Write the sidecar file atomically with the stamp taken before the export was read"""
+        size, mtime_ns, digest = self.stamp or self.take_stamp()
+        header = {'version': CACHE_VERSION, 'size': size, 'mtime_ns': mtime_ns, 'hash': digest,
+                  'columns': self.COLUMNS}
+        with atomic_write(self.path, newline='\n') as f:
+            f.write('#' + json.dumps(header) + '\n')
+            for meta in self.entries:
+                f.write(json.dumps(list(meta), ensure_ascii=False) + '\n')
@@ -4,11 +4,10 @@ Extract ChatGPT conversations from conversations.json into individual text files
 Each file is named: create_date__update_date_title.txt
 """
 
-import json
-import os
 import re
 from datetime import datetime
-from pathlib import Path
+
+from extractor import IndividualFilesSink, iter_export, run_pipeline, walk_all_branches
 
 
 def sanitize_filename(filename):
@@ -34,20 +33,14 @@ def timestamp_to_date(timestamp):
 def traverse_messages(mapping, node_id, visited=None):
     """
     Traverse the message tree in depth-first order to extract messages.
+    Uses an explicit stack, so very deep threads can't hit the recursion limit.
     Returns a list of message dictionaries.
     """
-    if visited is None:
-        visited = set()
-
-    if node_id in visited or node_id not in mapping:
-        return []
-
-    visited.add(node_id)
-    node = mapping[node_id]
     messages = []
+    for node in walk_all_branches(mapping, [node_id], visited):
+        if not node.get('message'):
+            continue
 
-    # Add current message if it exists and has content
-    if node.get('message'):
         msg = node['message']
         author_role = msg.get('author', {}).get('role', 'unknown')
         content = msg.get('content', {})
@@ -64,11 +57,6 @@ def traverse_messages(mapping, node_id, visited=None):
                         'create_time': msg.get('create_time')
                     })
 
-    # Traverse children in order
-    children = node.get('children', [])
-    for child_id in children:
-        messages.extend(traverse_messages(mapping, child_id, visited))
-
     return messages
 
 
@@ -116,51 +104,33 @@ def format_conversation(conversation):
     return '\n'.join(output)
 
 
+def conversation_filename(conversation_id, conversation):
+    """Build the create_date__update_date_title.txt filename for a conversation."""
+    title = conversation.get('title', 'Untitled')
+    create_date = timestamp_to_date(conversation.get('create_time'))
+    update_date = timestamp_to_date(conversation.get('update_time'))
+    return f"{create_date}__{update_date}_{sanitize_filename(title)}.txt"
+
+
 def extract_conversations(json_file, output_dir='conversations_output'):
     """
     Extract all conversations from the JSON file into separate text files.
+    Runs on the shared extractor pipeline with this script's own text format.
     """
-    # Create output directory
-    output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
-
     print(f"Reading {json_file}...")
-    print("This may take a while for large files...")
-
-    # Read and parse JSON
-    with open(json_file, 'r', encoding='utf-8') as f:
-        conversations = json.load(f)
-
-    print(f"Found {len(conversations)} conversations")
     print(f"Extracting to {output_dir}/")
 
-    # Process each conversation
-    for idx, conversation in enumerate(conversations, 1):
-        title = conversation.get('title', 'Untitled')
-        create_time = conversation.get('create_time')
-        update_time = conversation.get('update_time')
-
-        # Format filename: create_date__update_date_title.txt
-        create_date = timestamp_to_date(create_time)
-        update_date = timestamp_to_date(update_time)
-        safe_title = sanitize_filename(title)
-
-        filename = f"{create_date}__{update_date}_{safe_title}.txt"
-        filepath = output_path / filename
-
-        # Format and save conversation
-        try:
-            content = format_conversation(conversation)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-
-            if idx % 100 == 0:
-                print(f"  Processed {idx}/{len(conversations)} conversations...")
-        except Exception as e:
-            print(f"  Error processing conversation '{title}': {e}")
-            continue
+    def report(phase, done, total):
+        if phase == 'read' and done % 100 == 0:
+            print(f"  Processed {done} conversations...")
+
+    sink = IndividualFilesSink(output_dir, filename_func=conversation_filename,
+                               render_key='extract_conversations')
+    run_pipeline(iter_export(json_file, with_source=True), [sink], render=format_conversation,
+                 log=lambda message: print(f"  {message}"), progress=report)
 
-    print(f"\nCompleted! Extracted {len(conversations)} conversations to {output_dir}/")
+    print("\nCompleted!")
+    return sink.count
 
 
 if __name__ == '__main__':
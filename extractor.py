@@ -8,11 +8,104 @@ Supports both individual files and combined archive modes
 import json
 import os
 import re
+import codecs
+import sys
 import argparse
 import hashlib
-from datetime import datetime
+import tempfile
+import time
+import heapq
+import queue
+import sqlite3
+import threading
+import zipfile
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 
+from archive_index import (FRAME_ENTRIES, INDEX_SUFFIX, ArchiveIndex, ArchiveWriter, atomic_write,
+                           entry_body, list_shards, seal_entry, shard_location)
+from conversation_db import ConversationDB
+from export_cache import CACHE_SUFFIX, ConversationMeta, ExportCache
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# Bytes read from the export per refill while streaming
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Conversations sent to a worker process per task when rendering in parallel
+RENDER_CHUNK_SIZE = 32
+
+# Individual files are written on this many I/O threads (0 = write inline)
+DEFAULT_IO_THREADS = 4
+
+# Write buffer per open file, and pending writes queued per I/O thread
+WRITE_BUFFER_SIZE = 64 << 10
+WRITE_QUEUE_SIZE = 64
+
+# Memory for ArchiveSink's sort tuples before sorted runs spill to disk, and
+# the rough size of one tuple in memory
+DEFAULT_SORT_MEMORY = 64 << 20
+SORT_ENTRY_BYTES = 256
+
+# Shard names of a sharded archive by period (strftime of create_time), the
+# shard (or date-layout directory) for conversations without one, and the
+# names of size-based shards
+SHARD_PERIODS = {'month': '%Y-%m', 'year': '%Y'}
+UNDATED_NAME = 'undated'
+SIZE_SHARD_NAME = 'part-{:04d}'
+
+# Conversations written to SQLite per transaction
+SQLITE_BATCH_SIZE = 500
+
+# JSONL output: size at which a part file is finished and the next started,
+# and the characters per token assumed for ASCII text by estimate_tokens
+JSONL_PART_BYTES = 256 << 20
+JSONL_PART_NAME = 'part-{:04d}.jsonl'
+CHARS_PER_TOKEN = 4
+
+# Incremental-extraction manifest kept in the individual files output directory
+MANIFEST_FILENAME = '.extractor_manifest.json'
+MANIFEST_VERSION = 1
+
+# watch: seconds between polls of the inbox, seconds a file's size and mtime
+# must hold still before it counts as fully arrived, and the state file
+# recording processed exports
+WATCH_INTERVAL = 5
+WATCH_SETTLE = 10
+WATCH_STATE_FILENAME = '.extractor_watch.json'
+
+# Checkpoint journal of the files a run has put in place, one JSON line each,
+# removed when the run finishes; --resume replays what a killed run left
+JOURNAL_FILENAME = '.extractor_journal'
+
+# Suffix of individual files while they are being written; distinctive so
+# that cleaning up after a killed run never touches the user's own .tmp files
+TMP_SUFFIX = '.extractor-tmp'
+
+# Directory layouts for individual files: all in the output directory, a
+# YYYY/MM/ tree by create_time, or buckets named by the first HASH_FANOUT hex
+# digits of the ID's sha1. Nested layouts get a top-level index file.
+LAYOUTS = ('flat', 'date', 'hash')
+HASH_FANOUT = 2
+INDEX_FILENAME = 'index.tsv'
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# What may follow a number cut off at the end of the buffer, e.g. '1' of '1.5'
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+# Longest token a decode error can point at while it is still being read,
+# e.g. 'fals' or '-Infinit'; errors further from the end of the buffer are real
+_MAX_PARTIAL_TOKEN = 8
+
 
 def sanitize_filename(title, max_length=100):
     """Convert conversation title to safe filename"""
@@ -28,41 +121,92 @@ def sanitize_filename(title, max_length=100):
     return safe_title if safe_title else 'untitled'
 
 
-def extract_conversation_text(conversation):
-    """Extract text content from conversation structure"""
-    lines = []
-    
-    # Add title as header
-    title = conversation.get('title', 'Untitled Conversation')
-    lines.append(f"Title: {title}\n")
-    lines.append("=" * 80 + "\n\n")
-    
-    # Process messages
-    mapping = conversation.get('mapping', {})
-    
-    # Build message tree and extract in order
-    messages = []
-    for node_id, node in mapping.items():
+def active_branch_nodes(mapping, current_node):
+    """Return the nodes from the root down to current_node by following parent links
+
+    This is the branch shown in the ChatGPT UI; regenerated and abandoned
+    replies hang off other branches. Runs in O(depth) with no recursion.
+    """
+    chain = []
+    seen = set()
+    node_id = current_node
+    while node_id is not None and node_id in mapping and node_id not in seen:
+        seen.add(node_id)
+        node = mapping[node_id]
+        chain.append(node)
+        node_id = node.get('parent')
+    chain.reverse()
+    return chain
+
+
+def walk_all_branches(mapping, roots=None, visited=None):
+    """Yield every node depth-first, children in order, using an explicit stack
+
+    roots defaults to nodes without a parent in the mapping. Each node is
+    visited once, so very long threads can't hit the recursion limit and
+    cycles in a malformed mapping can't loop forever.
+    """
+    if roots is None:
+        roots = [node_id for node_id, node in mapping.items()
+                 if node.get('parent') is None or node.get('parent') not in mapping]
+    if visited is None:
+        visited = set()
+
+    stack = list(reversed(roots))
+    while stack:
+        node_id = stack.pop()
+        if node_id in visited or node_id not in mapping:
+            continue
+        visited.add(node_id)
+        node = mapping[node_id]
+        yield node
+        stack.extend(reversed(node.get('children') or []))
+
+
+def iter_conversation_nodes(conversation, all_branches=False):
+    """Yield mapping nodes in reading order
+
+    Follows the active branch ending at current_node by default, or walks
+    every branch when all_branches is set or current_node is missing.
+    """
+    mapping = conversation.get('mapping') or {}
+    current_node = conversation.get('current_node')
+    if not all_branches and current_node in mapping:
+        return iter(active_branch_nodes(mapping, current_node))
+    return walk_all_branches(mapping)
+
+
+def iter_messages(conversation, all_branches=False):
+    """Yield {'role', 'text', 'create_time', 'model'} for each message with text content"""
+    for node in iter_conversation_nodes(conversation, all_branches):
         message = node.get('message')
         if message and message.get('content'):
             content = message.get('content', {})
             parts = content.get('parts', [])
             author_role = message.get('author', {}).get('role', 'unknown')
-            
+
             if parts and any(parts):  # Has actual content
                 text = '\n'.join(str(part) for part in parts if part)
                 if text.strip():
-                    messages.append({
+                    yield {
                         'role': author_role,
                         'text': text,
-                        'create_time': message.get('create_time')
-                    })
-    
-    # Sort by creation time
-    messages.sort(key=lambda x: x.get('create_time', 0))
-    
-    # Format messages
-    for msg in messages:
+                        'create_time': message.get('create_time'),
+                        'model': (message.get('metadata') or {}).get('model_slug'),
+                    }
+
+
+def extract_conversation_text(conversation, all_branches=False):
+    """Extract text content from conversation structure"""
+    lines = []
+
+    # Add title as header
+    title = conversation.get('title', 'Untitled Conversation')
+    lines.append(f"Title: {title}\n")
+    lines.append("=" * 80 + "\n\n")
+
+    # Messages come out of the tree walk already in thread order
+    for msg in iter_messages(conversation, all_branches):
         role = msg['role'].upper()
         if role == 'USER':
             lines.append(f"USER:\n{msg['text']}\n\n")
@@ -70,30 +214,81 @@ def extract_conversation_text(conversation):
             lines.append(f"ASSISTANT:\n{msg['text']}\n\n")
         elif role == 'SYSTEM':
             lines.append(f"SYSTEM:\n{msg['text']}\n\n")
-    
+
     return ''.join(lines)
 
 
-def parse_existing_archive(archive_path):
-    """Parse existing archive file to extract conversation IDs already present"""
-    if not os.path.exists(archive_path):
-        return set()
-    
-    existing_ids = set()
+def estimate_tokens(text):
+    """Rough token count: CHARS_PER_TOKEN ASCII characters per token, one per other character
+
+    Close enough to BPE tokenizers for sizing chunks, at the cost of one
+    C-level encode instead of a tokenizer pass.
+    """
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return -(-ascii_chars // CHARS_PER_TOKEN) + len(text) - ascii_chars
+
+
+def chunk_messages(messages, max_tokens, overlap=0):
+    """Split messages into windows of about max_tokens estimated tokens
+
+    Yields (messages, tokens) for each window. A message longer than
+    max_tokens is first cut into pieces, numbered by a 'part' key. Every
+    window after the first starts with the trailing messages of the one
+    before, up to overlap tokens, so context carries across the cut.
+    """
+    pieces = []
+    for message in messages:
+        tokens = estimate_tokens(message['text'])
+        if tokens <= max_tokens:
+            pieces.append((message, tokens))
+            continue
+        text = message['text']
+        start = part = 0
+        while start < len(text):
+            piece = text[start:start + max_tokens * CHARS_PER_TOKEN]
+            tokens = estimate_tokens(piece)
+            while tokens > max_tokens:
+                # Every character is at most one token, so this never empties the piece
+                piece = piece[:len(piece) * max_tokens // tokens]
+                tokens = estimate_tokens(piece)
+            pieces.append((dict(message, text=piece, part=part), tokens))
+            start += len(piece)
+            part += 1
+
+    window = []
+    total = 0
+    for piece, tokens in pieces:
+        if window and total + tokens > max_tokens:
+            yield [message for message, _ in window], total
+            kept = []
+            kept_total = 0
+            for message, count in reversed(window):
+                if kept_total + count > overlap or kept_total + count + tokens > max_tokens:
+                    break
+                kept.append((message, count))
+                kept_total += count
+            window = kept[::-1]
+            total = kept_total
+        window.append((piece, tokens))
+        total += tokens
+    if window:
+        yield [message for message, _ in window], total
+
+
+def parse_existing_archive(archive_path, log=print):
+    """Return the conversation IDs already present in an archive, using its sidecar index"""
     try:
-        with open(archive_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            # Look for ID lines in the format "ID: [conversation_id]"
-            id_matches = re.findall(r'^ID: (.+)$', content, re.MULTILINE)
-            existing_ids = set(id_matches)
+        return ArchiveIndex.load(archive_path, log).ids()
     except Exception as e:
-        print(f"Warning: Could not parse existing archive: {e}")
-    
-    return existing_ids
+        log(f"Warning: Could not parse existing archive: {e}")
+        return set()
 
 
-def create_archive_entry(conversation, conversation_id):
-    """Create a formatted archive entry for a conversation"""
+def create_archive_entry(conversation, conversation_id, all_branches=False, content=None):
+    """Create a formatted archive entry for a conversation
+
+    Pass content to reuse text already rendered by extract_conversation_text.
+    """
     title = conversation.get('title', 'Untitled Conversation')
     create_time = conversation.get('create_time', 0)
     
@@ -114,7 +309,8 @@ def create_archive_entry(conversation, conversation_id):
     lines.append("")
     
     # Add conversation content
-    content = extract_conversation_text(conversation)
+    if content is None:
+        content = extract_conversation_text(conversation, all_branches)
     lines.append(content)
     
     lines.append("=" * 80)
@@ -123,98 +319,2214 @@ def create_archive_entry(conversation, conversation_id):
     return '\n'.join(lines)
 
 
-def write_archive(conversations_data, archive_path, append=True):
-    """Write conversations to archive file"""
-    # Parse existing IDs if appending
-    existing_ids = set()
-    if append:
-        existing_ids = parse_existing_archive(archive_path)
-        print(f"Found {len(existing_ids)} existing conversations in archive")
-    
-    # Collect all conversations with metadata
-    all_conversations = []
-    
-    for conv_id, conversation in conversations_data.items():
-        create_time = conversation.get('create_time', 0)
-        all_conversations.append({
-            'id': conv_id,
-            'data': conversation,
-            'create_time': create_time
-        })
-    
-    # Sort by creation time, newest first
-    all_conversations.sort(key=lambda x: x['create_time'], reverse=True)
-    
-    # Filter to only new conversations if appending
-    if append:
-        new_conversations = [c for c in all_conversations if c['id'] not in existing_ids]
-        print(f"Found {len(new_conversations)} new conversations to add")
-        
-        if not new_conversations:
-            print("No new conversations to add to archive")
-            return
-        
-        # Append new conversations to archive
-        with open(archive_path, 'a', encoding='utf-8') as f:
-            for conv in new_conversations:
-                entry = create_archive_entry(conv['data'], conv['id'])
-                f.write(entry)
-                f.write('\n')
-        
-        print(f"Appended {len(new_conversations)} conversations to {archive_path}")
+def individual_filename(conversation_id, conversation):
+    """Build the create_date__update_date_title_id.txt filename for a conversation"""
+    title = conversation.get('title', 'Untitled Conversation')
+    safe_title = sanitize_filename(title)
+
+    # Get timestamps
+    create_time = conversation.get('create_time', 0)
+    update_time = conversation.get('update_time', 0)
+
+    # Format dates
+    if create_time:
+        create_date = datetime.fromtimestamp(create_time).strftime('%Y-%m-%d')
     else:
-        # Write fresh archive
-        with open(archive_path, 'w', encoding='utf-8') as f:
-            for conv in all_conversations:
-                entry = create_archive_entry(conv['data'], conv['id'])
-                f.write(entry)
-                f.write('\n')
-        
-        print(f"Wrote {len(all_conversations)} conversations to {archive_path}")
+        create_date = 'unknown'
 
+    if update_time:
+        update_date = datetime.fromtimestamp(update_time).strftime('%Y-%m-%d')
+    else:
+        update_date = 'unknown'
 
-def write_individual_files(conversations_data, output_dir):
-    """Write each conversation to individual text file"""
-    os.makedirs(output_dir, exist_ok=True)
+    return f"{create_date}__{update_date}_{safe_title}_{conversation_id[:8]}.txt"
+
+
+def _peak_rss():
+    """Peak resident set size in bytes of this process and of its finished workers"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+class RunStats:
+    """Per-stage wall/CPU time, throughput, bytes written and peak memory for one run"""
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self.stages = {}  # name -> [wall, cpu, calls], in first-seen order
+        self.slowest = []  # min-heap of (seconds, conversation_id, title)
+        self.conversations = 0
+        self.rendered = 0
+        self.bytes_written = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_rss = None
+        self.peak_rss_workers = None
+        self._started = self.start()
+
+    @staticmethod
+    def start():
+        """Timestamp to pass to add()"""
+        return time.perf_counter(), time.process_time()
+
+    def add(self, name, started, calls=1):
+        """Add the time since started (from start()) to a stage"""
+        wall, cpu = started
+        self.add_time(name, time.perf_counter() - wall, time.process_time() - cpu, calls)
+
+    def add_time(self, name, wall, cpu, calls=1):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = [0.0, 0.0, 0]
+        stage[0] += wall
+        stage[1] += cpu
+        stage[2] += calls
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as one call of a stage"""
+        started = self.start()
+        try:
+            yield
+        finally:
+            self.add(name, started)
+
+    def record_conversation(self, conversation_id, title, seconds):
+        """Track the top-N slowest conversations"""
+        item = (seconds, conversation_id, title)
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, item)
+        elif self.top_n and item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def finish(self, sinks=()):
+        """Stop the clock and collect bytes written and peak memory"""
+        wall, cpu = self._started
+        self.wall = time.perf_counter() - wall
+        self.cpu = time.process_time() - cpu
+        self.bytes_written = sum(sink.bytes_written for sink in sinks)
+        self.peak_rss, self.peak_rss_workers = _peak_rss()
+
+    def to_dict(self):
+        """Machine-readable summary for --stats-json"""
+        return {
+            'conversations': self.conversations,
+            'rendered': self.rendered,
+            'wall_seconds': self.wall,
+            'cpu_seconds': self.cpu,
+            'conversations_per_sec': self.conversations / self.wall if self.wall else None,
+            'bytes_written': self.bytes_written,
+            'peak_rss_bytes': self.peak_rss,
+            'peak_rss_workers_bytes': self.peak_rss_workers,
+            'stages': {name: {'wall_seconds': wall, 'cpu_seconds': cpu, 'calls': calls}
+                       for name, (wall, cpu, calls) in self.stages.items()},
+            'slowest': [{'id': conversation_id, 'title': title, 'seconds': seconds}
+                        for seconds, conversation_id, title in sorted(self.slowest, reverse=True)],
+        }
+
+    def report(self):
+        """Human-readable summary lines for the CLI and the GUI log"""
+        rate = self.conversations / self.wall if self.wall else 0.0
+        lines = ["Run statistics",
+                 f"  {'Stage':<24}{'Wall (s)':>10}{'CPU (s)':>10}{'Calls':>10}"]
+        for name, (wall, cpu, calls) in self.stages.items():
+            lines.append(f"  {name:<24}{wall:>10.3f}{cpu:>10.3f}{calls:>10}")
+        lines.append(f"  {'total':<24}{self.wall:>10.3f}{self.cpu:>10.3f}")
+        lines.append(f"  Conversations: {self.conversations} read, {self.rendered} rendered "
+                     f"({rate:.1f}/s)")
+        lines.append(f"  Bytes written: {self.bytes_written:,}")
+        if self.peak_rss is not None:
+            lines.append(f"  Peak RSS: {self.peak_rss / 2**20:.1f} MB "
+                         f"(workers: {self.peak_rss_workers / 2**20:.1f} MB)")
+        if self.slowest:
+            lines.append(f"  Slowest {len(self.slowest)} conversations:")
+            for seconds, conversation_id, title in sorted(self.slowest, reverse=True):
+                lines.append(f"    {seconds:8.3f}s  {conversation_id}  {title}")
+        return lines
+
+
+def conversation_digest(conversation):
+    """Content hash of a conversation, independent of how its export was formatted"""
+    canonical = json.dumps(conversation, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def source_unchanged(update_time, digest, record):
+    """Whether a stored update_time and content hash still describe record's conversation
+
+    Either one matching is enough, so hashes stored by older versions,
+    which hashed the raw export bytes, don't make everything look changed.
+    """
+    if digest is not None and digest == record.digest:
+        return True
+    return update_time is not None and update_time == record.conversation.get('update_time')
+
+
+class ConversationRecord:
+    """A conversation moving through the pipeline, rendered once and shared by every sink"""
+
+    __slots__ = ('id', 'conversation', 'source', 'loader', 'sinks', 'text', 'error', '_digest')
+
+    def __init__(self, conversation_id, conversation, source=None, loader=None):
+        self.id = conversation_id
+        self.conversation = conversation
+        self.source = source  # SourceSpan in the export, when streamed
+        # With a loader, conversation holds only the top-level fields until
+        # a sink wants the record and the full conversation is decoded
+        self.loader = loader
+        self.sinks = []  # Sinks that want this conversation
+        self.text = None
+        self.error = None
+        self._digest = None
+
+    @property
+    def digest(self):
+        """conversation_digest of the conversation, taken from its SourceSpan when streamed"""
+        if self._digest is None:
+            if self.source is not None:
+                self._digest = self.source.digest
+            else:
+                self._digest = conversation_digest(self.conversation)
+        return self._digest
+
+
+class PipelineCancelled(Exception):
+    """Raised by run_pipeline when its cancel event is set"""
+
+
+class OutputSink:
+    """Base class for pipeline outputs
+
+    The pipeline calls open(), then wants() and write() for each
+    conversation, then close(), or abort() if the run fails.
+    """
+
+    name = 'output'
+    renders = True  # Whether write() uses record.text
+
+    def __init__(self):
+        self.count = 0
+        self.bytes_written = 0
+        self.log = print
+        self.stats = RunStats()
+        # For a long close(); the pipeline points it at its own progress callback
+        self.progress = lambda done, total: None
+
+    def open(self, log=print, stats=None):
+        self.log = log
+        if stats is not None:
+            self.stats = stats
+
+    def wants(self, record):
+        """Whether this sink needs the record; called before it is rendered"""
+        return True
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the output and return the number of conversations written"""
+        return self.count
+
+    def abort(self):
+        """Release resources after a failed run"""
+
+
+def render_key_for(all_branches=False):
+    """Identify the render settings recorded in the manifest"""
+    return 'all-branches' if all_branches else 'active-branch'
+
+
+def layout_subdir(layout, conversation_id, conversation):
+    """Directory of a conversation's file under the output directory ('' for flat)"""
+    if layout == 'date':
+        create_time = conversation.get('create_time')
+        if not create_time:
+            return UNDATED_NAME
+        return datetime.fromtimestamp(create_time).strftime('%Y/%m')
+    if layout == 'hash':
+        return hashlib.sha1(conversation_id.encode('utf-8')).hexdigest()[:HASH_FANOUT]
+    return ''
+
+
+def list_output_files(output_dir):
+    """Set of '/'-separated paths of the files under output_dir, relative to it"""
+    found = set()
+    for root, dirs, files in os.walk(output_dir):
+        prefix = os.path.relpath(root, output_dir).replace(os.sep, '/') + '/'
+        if prefix == './':
+            prefix = ''
+        found.update(prefix + name for name in files)
+    return found
+
+
+def write_output_index(output_dir, manifest):
+    """Write INDEX_FILENAME: one id, date, title, file line per conversation, newest first"""
+    rows = sorted(manifest.items(), key=lambda item: item[1].get('create_time') or 0, reverse=True)
+    with atomic_write(os.path.join(output_dir, INDEX_FILENAME), newline='\n') as f:
+        f.write('id\tcreated\ttitle\tfile\n')
+        for conversation_id, entry in rows:
+            create_time = entry.get('create_time')
+            created = datetime.fromtimestamp(create_time).isoformat() if create_time else ''
+            title = ' '.join((entry.get('title') or '').split())
+            f.write(f"{conversation_id}\t{created}\t{title}\t{entry.get('file')}\n")
 
-    count = 0
-    for conversation_id, conversation in conversations_data.items():
-        title = conversation.get('title', 'Untitled Conversation')
-        safe_title = sanitize_filename(title)
 
-        # Get timestamps
-        create_time = conversation.get('create_time', 0)
-        update_time = conversation.get('update_time', 0)
+def load_manifest(output_dir, render_key=None):
+    """Load the incremental-extraction manifest: {id: {'update_time', 'hash', 'file', ...}}
 
-        # Format dates
-        if create_time:
-            create_date = datetime.fromtimestamp(create_time).strftime('%Y-%m-%d')
+    'file' is the path relative to output_dir, '/'-separated.
+
+    Returns an empty manifest if there is none, or if it was written with a
+    different manifest version or render settings.
+    """
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != MANIFEST_VERSION or data.get('render') != render_key:
+        return {}
+    return data.get('conversations', {})
+
+
+def save_manifest(output_dir, manifest, render_key=None):
+    """Write the manifest atomically"""
+    with atomic_write(os.path.join(output_dir, MANIFEST_FILENAME)) as f:
+        json.dump({'version': MANIFEST_VERSION, 'render': render_key,
+                   'conversations': manifest}, f, ensure_ascii=False)
+
+
+class FileWriterPool:
+    """Write text files on a pool of I/O threads fed by bounded queues
+
+    Each path always goes to the same thread, and files are renamed into
+    place from a TMP_SUFFIX name once complete.
+    """
+
+    def __init__(self, threads=DEFAULT_IO_THREADS, buffer_size=WRITE_BUFFER_SIZE,
+                 fsync_every=0, queue_size=WRITE_QUEUE_SIZE, on_commit=None):
+        self.buffer_size = buffer_size
+        self.fsync_every = fsync_every
+        self.on_commit = on_commit
+        self.files_written = 0
+        self.bytes_written = 0
+        self.wall = 0.0  # Summed over threads
+        self.cpu = 0.0
+        self.errors = []  # (key, path, exception) for writes that failed
+        self._lock = threading.Lock()
+        self._inline_pending = []
+        self._queues = [queue.Queue(queue_size) for _ in range(threads)]
+        self._threads = [threading.Thread(target=self._run, args=(q,), daemon=True)
+                         for q in self._queues]
+        for thread in self._threads:
+            thread.start()
+
+    def write(self, path, text, key=None):
+        """Queue text to be written to path; key identifies it in errors"""
+        self._submit(('write', path, text, key))
+
+    def remove(self, path):
+        """Queue removal of path, ordered after any queued write to it"""
+        self._submit(('remove', path, None, None))
+
+    def _submit(self, job):
+        if not self._queues:
+            self._do(job, self._inline_pending)
+            return
+        self._queues[hash(job[1]) % len(self._queues)].put(job)
+
+    def _run(self, jobs):
+        pending = []
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            self._do(job, pending)
+        self._sync(pending)
+
+    def _do(self, job, pending):
+        action, path, text, key = job
+        wall, cpu = time.perf_counter(), time.thread_time()
+        f = None
+        try:
+            if action == 'remove':
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            else:
+                f = open(path + TMP_SUFFIX, 'w', encoding='utf-8', buffering=self.buffer_size)
+                f.write(text)
+                size = f.tell()
+                if self.fsync_every:
+                    f.flush()
+                    pending.append((f, key, path))
+                else:
+                    f.close()
+                    self._commit(key, path)
+                f = None
+                with self._lock:
+                    self.files_written += 1
+                    self.bytes_written += size
+        except Exception as e:
+            self._failed(key, path, e)
+        finally:
+            if f is not None:
+                f.close()
+        if len(pending) >= max(self.fsync_every, 1):
+            self._sync(pending)
+        with self._lock:
+            self.wall += time.perf_counter() - wall
+            self.cpu += time.thread_time() - cpu
+
+    def _sync(self, pending):
+        """fsync, close and rename into place a batch of written files"""
+        for f, key, path in pending:
+            try:
+                os.fsync(f.fileno())
+                f.close()
+                self._commit(key, path)
+            except OSError as e:
+                f.close()
+                self._failed(key, path, e)
+        del pending[:]
+
+    def _commit(self, key, path):
+        os.replace(path + TMP_SUFFIX, path)
+        if self.on_commit is not None:
+            with self._lock:
+                self.on_commit(key)
+
+    def _failed(self, key, path, error):
+        with self._lock:
+            self.errors.append((key, path, error))
+        try:
+            os.remove(path + TMP_SUFFIX)
+        except OSError:
+            pass
+
+    def close(self):
+        """Wait for every queued job to finish"""
+        for jobs in self._queues:
+            jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._queues = []
+        self._threads = []
+        self._sync(self._inline_pending)
+
+
+class IndividualFilesSink(OutputSink):
+    """Write each conversation to its own text file
+
+    incremental skips conversations the manifest says are unchanged,
+    resume replays the checkpoint journal of a killed run, and layout
+    picks the flat, date or hash directory structure.
+    """
+
+    name = 'individual'
+
+    def __init__(self, output_dir, filename_func=individual_filename, incremental=True,
+                 render_key=None, io_threads=DEFAULT_IO_THREADS, write_buffer=WRITE_BUFFER_SIZE,
+                 fsync_every=0, layout='flat', resume=False):
+        super().__init__()
+        self.output_dir = output_dir
+        self.filename_func = filename_func
+        self.layout = layout
+        self.incremental = incremental
+        self.resume = resume
+        self.render_key = render_key
+        self.io_threads = io_threads
+        self.write_buffer = write_buffer
+        self.fsync_every = fsync_every
+        self.writer = None
+        self.manifest = {}
+        self.existing_files = set()
+        self.made_dirs = set()
+        self.vacated_dirs = set()
+        self.journal = None
+        self.resumed = set()
+        self.counts = dict.fromkeys(['new', 'changed', 'unchanged', 'renamed'], 0)
+
+    def open(self, log=print, stats=None):
+        super().open(log, stats)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.writer = FileWriterPool(self.io_threads, self.write_buffer, self.fsync_every,
+                                     on_commit=self._journal_commit)
+        self.made_dirs = set()
+        self.vacated_dirs = set()
+        if self.incremental:
+            self.manifest = load_manifest(self.output_dir, self.render_key)
+
+        journal_path = os.path.join(self.output_dir, JOURNAL_FILENAME)
+        replayed = self._read_journal(journal_path) if self.resume else {}
+        if replayed:
+            self.manifest.update(replayed)
+            self.resumed = set(replayed)
+            log(f"Resuming: {len(replayed)} conversations were written before the last run stopped")
+        elif os.path.exists(journal_path) and not self.resume:
+            log(f"The last run in {self.output_dir} did not finish; starting over "
+                f"(use --resume to continue it)")
+
+        if self.incremental or self.resumed:
+            # One listing per directory instead of a stat per conversation
+            self.existing_files = list_output_files(self.output_dir)
+            for name in [name for name in self.existing_files if name.endswith(TMP_SUFFIX)]:
+                # Half-written files of a run that was killed
+                os.remove(os.path.join(self.output_dir, name))
+                self.existing_files.discard(name)
+        self.journal = open(journal_path, 'a' if replayed else 'w', encoding='utf-8')
+
+    def _read_journal(self, path):
+        """{id: manifest entry} for every file the journal at path says was written"""
+        committed = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        conversation_id, entry = json.loads(line)
+                    except ValueError:
+                        break  # Cut off mid-line by the kill
+                    if entry is not None:
+                        committed[conversation_id] = entry
+        except OSError:
+            pass
+        return committed
+
+    def _journal_commit(self, conversation_id):
+        """FileWriterPool callback: a conversation's file is in place"""
+        self.journal.write(json.dumps([conversation_id, self.manifest.get(conversation_id)],
+                                      ensure_ascii=False) + '\n')
+        self.journal.flush()
+
+    def wants(self, record):
+        if not self.incremental and record.id not in self.resumed:
+            return True
+        entry = self.manifest.get(record.id)
+        if (entry is not None
+                and source_unchanged(entry.get('update_time'), entry.get('hash'), record)
+                and entry.get('file') in self.existing_files
+                and entry['file'].rpartition('/')[0] == layout_subdir(self.layout, record.id,
+                                                                      record.conversation)):
+            self.counts['unchanged'] += 1
+            return False
+        return True
+
+    def write(self, record):
+        started = self.stats.start()
+        filename = self.filename_func(record.id, record.conversation)
+        subdir = layout_subdir(self.layout, record.id, record.conversation)
+        if subdir:
+            if subdir not in self.made_dirs:
+                os.makedirs(os.path.join(self.output_dir, subdir), exist_ok=True)
+                self.made_dirs.add(subdir)
+            filename = f"{subdir}/{filename}"
+        self.stats.add('filename', started)
+
+        entry = self.manifest.get(record.id)
+        conversation = record.conversation
+        # Recorded before the write is queued, for the journal to pick up
+        self.manifest[record.id] = {
+            'update_time': conversation.get('update_time'),
+            'hash': record.digest,
+            'file': filename,
+            'title': conversation.get('title'),
+            'create_time': conversation.get('create_time'),
+        }
+        self.writer.write(os.path.join(self.output_dir, filename), record.text, record.id)
+
+        if entry is None:
+            self.counts['new'] += 1
+        else:
+            self.counts['changed'] += 1
+            old_file = entry.get('file')
+            if old_file and old_file != filename:
+                # Title, date or layout changed, so the old file would be left behind
+                self.writer.remove(os.path.join(self.output_dir, old_file))
+                self.vacated_dirs.add(old_file.rpartition('/')[0])
+                self.counts['renamed'] += 1
+
+    def _finish_writes(self):
+        """Drain the writer and drop failed writes from the manifest"""
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.count = self.writer.files_written
+        self.bytes_written = self.writer.bytes_written
+        self.stats.add_time('file io (all threads)', self.writer.wall, self.writer.cpu,
+                            self.writer.files_written)
+        for conversation_id, path, error in self.writer.errors:
+            self.log(f"Error writing {os.path.basename(path)}: {error}")
+            # Not written, so the next run must not skip it
+            self.manifest.pop(conversation_id, None)
+        self.writer = None
+
+    def _save_manifest(self):
+        if self.incremental:
+            save_manifest(self.output_dir, self.manifest, self.render_key)
+        if self.layout != 'flat' or INDEX_FILENAME in self.existing_files:
+            write_output_index(self.output_dir, self.manifest)
+
+    def _prune_vacated_dirs(self):
+        """Remove the layout directories that moved files left empty, e.g. after a layout change"""
+        for subdir in sorted(self.vacated_dirs, key=len, reverse=True):
+            while subdir:
+                try:
+                    os.rmdir(os.path.join(self.output_dir, subdir))
+                except OSError:
+                    break  # Not empty, or already gone
+                subdir = subdir.rpartition('/')[0]
+
+    def _close_journal(self, keep=False):
+        """Close the journal, removing it unless keep is set"""
+        if self.journal is None:
+            return
+        self.journal.close()
+        self.journal = None
+        if not keep:
+            os.remove(os.path.join(self.output_dir, JOURNAL_FILENAME))
+
+    def close(self):
+        self._finish_writes()
+        self._save_manifest()
+        self._close_journal()
+        self._prune_vacated_dirs()
+        self.log(f"Extracted {self.count} conversations to {self.output_dir}/")
+        if self.incremental:
+            counts = self.counts
+            self.log(f"  {counts['new']} new, {counts['changed']} changed "
+                     f"({counts['renamed']} renamed), {counts['unchanged']} unchanged")
+        return self.count
+
+    def abort(self):
+        # Keep the files that were written so a re-run can skip them; only
+        # the journal records them when there is no manifest
+        self._finish_writes()
+        self._save_manifest()
+        self._close_journal(keep=not self.incremental)
+
+
+class ArchiveSink(OutputSink):
+    """Combined archive file, newest first, with a sidecar ID/offset index
+
+    Entries are spooled to a temporary file and ordered by an external sort
+    bounded by sort_memory; update re-appends changed conversations.
+    """
+
+    name = 'archive'
+
+    def __init__(self, archive_path, append=True, update=False, runs=None,
+                 sort_memory=DEFAULT_SORT_MEMORY, frame_entries=FRAME_ENTRIES, quiet=False):
+        super().__init__()
+        self.archive_path = archive_path
+        self.quiet = quiet
+        self.frame_entries = frame_entries
+        self.append = append or update
+        self.update = update
+        self.runs = runs
+        self.sort_limit = max(1, sort_memory // SORT_ENTRY_BYTES)
+        self.index = None
+        self.spool = None
+        self.latest = {}  # conversation_id -> spool offset of its latest entry
+        self.buffer = []  # Sort tuples of the current run, not yet sorted
+        self.chunks = []  # Sorted runs still in memory
+        self.run_files = []  # Sorted runs spilled to temporary files
+        self.buffered = 0
+        self.current_run = None
+        self.verified = {}  # conversation_id -> (update_time, digest) confirmed unchanged
+
+    def open(self, log=print, stats=None):
+        super().open(log, stats)
+        # Load existing IDs from the sidecar index if appending
+        if self.append:
+            try:
+                with self.stats.stage('archive dedupe'):
+                    self.index = ArchiveIndex.load(self.archive_path, log)
+            except Exception as e:
+                log(f"Warning: Could not parse existing archive: {e}")
+                self.index = ArchiveIndex(self.archive_path)
+            self._summary(f"Found {len(self.index)} existing conversations in archive")
         else:
-            create_date = 'unknown'
+            self.index = ArchiveIndex(self.archive_path)
+
+        spool_dir = os.path.dirname(os.path.abspath(self.archive_path))
+        self.spool = tempfile.TemporaryFile(dir=spool_dir)
+        self.latest = {}
+        self.buffer = []
+        self.chunks = []
+        self.run_files = []
+        self.buffered = 0
+        self.current_run = None
+        self.verified = {}
+
+    def wants(self, record):
+        entry = self.index.get(record.id)
+        if entry is None:
+            return True
+        if not self.update:
+            return False
+        if entry.digest is None and entry.update_time is None:
+            return True  # Unknown source; write() compares the rendered bytes
+        return not source_unchanged(entry.update_time, entry.digest, record)
+
+    def write(self, record):
+        body = create_archive_entry(record.conversation, record.id, content=record.text).encode('utf-8')
+        data = seal_entry(body)
+        update_time = record.conversation.get('update_time')
+        existing = self.index.get(record.id)
+        if (existing is not None and existing.digest is None and existing.update_time is None
+                and entry_body(self.index.read_entry(record.id)) == body):
+            self.verified[record.id] = (update_time, record.digest)
+            return
+        create_time = record.conversation.get('create_time') or 0
+        offset = self.spool.tell()
+        self.spool.write(data)
+        # A later duplicate supersedes the earlier entry, like loading the
+        # export into a dict; the stale tuple is skipped when merging
+        self.latest[record.id] = offset
+
+        run = self.runs.get(record.id, 0) if self.runs else 0
+        if run != self.current_run:
+            self._end_run()
+            self.current_run = run
+        self.buffer.append((create_time, offset, len(data), record.id, update_time, record.digest))
+        self.buffered += 1
+        if self.buffered >= self.sort_limit:
+            self._spill()
+
+    def _end_run(self):
+        """Sort the buffered tuples into an in-memory run"""
+        if self.buffer:
+            self.buffer.sort(key=_newest_first, reverse=True)
+            self.chunks.append(self.buffer)
+            self.buffer = []
+
+    def _spill(self):
+        """Write every in-memory run to a temporary file to stay within sort_memory"""
+        self._end_run()
+        spool_dir = os.path.dirname(os.path.abspath(self.archive_path))
+        for chunk in self.chunks:
+            run_file = tempfile.TemporaryFile('w+', encoding='utf-8', dir=spool_dir)
+            for item in chunk:
+                run_file.write(json.dumps(item) + '\n')
+            run_file.seek(0)
+            self.run_files.append(run_file)
+        self.chunks = []
+        self.buffered = 0
+
+    def _ordered(self):
+        """Yield the latest spooled entry of each conversation, newest first"""
+        self._end_run()
+        runs = [(tuple(json.loads(line)) for line in run_file) for run_file in self.run_files]
+        runs.extend(self.chunks)
+        for item in heapq.merge(*runs, key=_newest_first, reverse=True):
+            if self.latest[item[3]] == item[1]:
+                yield item
+
+    def _release_runs(self):
+        for run_file in self.run_files:
+            run_file.close()
+        self.run_files = []
+        self.chunks = []
+        self.buffer = []
 
-        if update_time:
-            update_date = datetime.fromtimestamp(update_time).strftime('%Y-%m-%d')
+    def close(self):
+        try:
+            # Sort by creation time, newest first
+            total = len(self.latest)
+            updated = sum(1 for conv_id in self.latest if conv_id in self.index)
+            if self.run_files:
+                self.log(f"Merging {len(self.run_files) + len(self.chunks) + bool(self.buffer)} "
+                         f"sorted runs ({len(self.run_files)} spilled to disk)")
+
+            for conv_id, (update_time, digest) in self.verified.items():
+                self.index.set_source(conv_id, update_time, digest)
+
+            if self.append:
+                dropped = self.index.drop_incomplete()
+                if dropped:
+                    self.log(f"Dropped {dropped:,} bytes of an entry left incomplete by an "
+                             f"interrupted run from the end of {self.archive_path}")
+                if self.update:
+                    self._summary(f"Found {total - updated} new and {updated} changed "
+                                  f"conversations to add")
+                else:
+                    self._summary(f"Found {total} new conversations to add")
+                if not total:
+                    self._summary("No new conversations to add to archive")
+                    if self.verified or dropped:
+                        self.index.save()
+                    return 0
+
+            size_before = (os.path.getsize(self.archive_path)
+                            if self.append and os.path.exists(self.archive_path) else 0)
+            # A fresh archive is built next to the old one and swapped in, so a
+            # run killed while writing it leaves the previous archive intact
+            target = self.archive_path if self.append else self.archive_path + '.tmp'
+            try:
+                with ArchiveWriter(self.index, 'ab' if self.append else 'wb',
+                                   self.frame_entries, path=target) as writer:
+                    for done, item in enumerate(self._ordered()):
+                        create_time, offset, length, conv_id, update_time, digest = item
+                        self.spool.seek(offset)
+                        writer.write(conv_id, self.spool.read(length), update_time, digest)
+                        if done % 256 == 0:
+                            self.progress(done, total)
+                if target != self.archive_path:
+                    os.replace(target, self.archive_path)
+            except BaseException:
+                if target != self.archive_path and os.path.exists(target):
+                    os.remove(target)
+                raise
+            self.progress(total, total)
+            self.bytes_written = os.path.getsize(self.archive_path) - size_before
+        finally:
+            self.spool.close()
+            self._release_runs()
+
+        self.index.save()
+        self.count = total
+
+        if self.append:
+            self._summary(f"Appended {self.count} conversations to {self.archive_path}")
+            if updated:
+                self._summary(f"  {updated} replace older entries; run 'compact' to reclaim "
+                              f"{self.index.dead_bytes():,} bytes of tombstones")
         else:
-            update_date = 'unknown'
+            self._summary(f"Wrote {self.count} conversations to {self.archive_path}")
+        return self.count
+
+    def _summary(self, message):
+        if not self.quiet:
+            self.log(message)
+
+    def abort(self):
+        if self.spool is not None:
+            self.spool.close()
+        self._release_runs()
+
+
+def _newest_first(item):
+    """Sort key of an ArchiveSink sort tuple: its create_time"""
+    return item[0]
+
+
+def parse_shard_arg(value):
+    """Parse a --shard value: 'month', 'year', or a shard size in MB (returned in bytes)"""
+    value = value.strip().lower()
+    if value in SHARD_PERIODS:
+        return value
+    match = re.fullmatch(r'(\d+)\s*(?:mb)?', value)
+    if not match or not int(match.group(1)):
+        raise ValueError(f"Invalid shard '{value}' (use month, year or a size in MB)")
+    return int(match.group(1)) << 20
+
+
+class ShardedArchiveSink(OutputSink):
+    """Archive split into shard files by month, by year or by size
+
+    Each shard is an ArchiveSink opened the first time a conversation
+    routes to it, in a directory named after the archive.
+    """
+
+    name = 'archive'
 
-        # Create filename with date stamps: create_date__update_date_title_id.txt
-        filename = f"{create_date}__{update_date}_{safe_title}_{conversation_id[:8]}.txt"
-        filepath = os.path.join(output_dir, filename)
+    def __init__(self, archive_path, shard='month', append=True, update=False,
+                 sort_memory=DEFAULT_SORT_MEMORY, frame_entries=FRAME_ENTRIES):
+        super().__init__()
+        self.directory, self.extension = shard_location(archive_path)
+        self.shard = shard
+        self.append = append or update
+        self.update = update
+        self.sort_memory = sort_memory
+        self.sort_limit = max(1, sort_memory // SORT_ENTRY_BYTES)
+        self.frame_entries = frame_entries
+        self.shards = {}  # shard name -> ArchiveSink, opened on first use
+        self.existing = []  # Shard names found in the directory
+        self.owner = {}  # Size shards: conversation_id -> shard name
+        self.tail = None  # Size shards: the part new conversations go to
+        self.buffered = 0
 
-        # Extract and write content
-        content = extract_conversation_text(conversation)
+    def _path(self, name):
+        return os.path.join(self.directory, name + self.extension)
 
+    def open(self, log=print, stats=None):
+        super().open(log, stats)
+        os.makedirs(self.directory, exist_ok=True)
+        self.shards = {}
+        self.owner = {}
+        self.buffered = 0
+        self.existing = [os.path.basename(path)[:-len(self.extension)]
+                         for path in list_shards(self.directory)
+                         if path.endswith(self.extension)]
+        if self.append:
+            log(f"Found {len(self.existing)} existing shards in {self.directory}")
+
+        if self.shard not in SHARD_PERIODS:
+            parts = sorted(name for name in self.existing if re.fullmatch(r'part-\d+', name))
+            if self.append:
+                with self.stats.stage('archive dedupe'):
+                    for name in parts:
+                        index = ArchiveIndex.load(self._path(name), log)
+                        self.owner.update(dict.fromkeys(index.ids(), name))
+            self.tail = parts[-1] if parts and self.append else SIZE_SHARD_NAME.format(1)
+
+    def _shard(self, name):
+        sink = self.shards.get(name)
+        if sink is None:
+            sink = ArchiveSink(self._path(name), self.append, self.update,
+                               sort_memory=self.sort_memory, frame_entries=self.frame_entries,
+                               quiet=True)
+            sink.open(self.log, self.stats)
+            self.shards[name] = sink
+        return sink
+
+    def _period(self, record):
+        create_time = record.conversation.get('create_time')
+        if not create_time:
+            return UNDATED_NAME
+        return datetime.fromtimestamp(create_time).strftime(SHARD_PERIODS[self.shard])
+
+    def _next_part(self):
+        """The part for a new conversation, starting the next one once it is full"""
+        sink = self._shard(self.tail)
+        if sink.index.text_size() + sink.spool.tell() >= self.shard:
+            self.tail = SIZE_SHARD_NAME.format(int(self.tail.split('-')[1]) + 1)
+        return self.tail
+
+    def wants(self, record):
+        if self.shard in SHARD_PERIODS:
+            return self._shard(self._period(record)).wants(record)
+        name = self.owner.get(record.id)
+        return name is None or self._shard(name).wants(record)
+
+    def write(self, record):
+        if self.shard in SHARD_PERIODS:
+            name = self._period(record)
+        else:
+            name = self.owner.get(record.id)
+            if name is None:
+                name = self.owner[record.id] = self._next_part()
+        self._shard(name).write(record)
+        self.buffered += 1
+        if self.buffered >= self.sort_limit:
+            for sink in self.shards.values():
+                if sink.buffered:
+                    sink._spill()
+            self.buffered = 0
+
+    def close(self):
+        total = sum(len(sink.latest) for sink in self.shards.values())
+        done = 0
+        touched = 0
+        dead = 0
+        names = sorted(self.shards)
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            while names:
+                sink = self.shards[names.pop(0)]
+                sink.progress = lambda d, t, base=done: self.progress(base + d, total)
+                written = sink.close()
+                done += len(sink.latest)
+                if written:
+                    touched += 1
+                    self.log(f"  {os.path.basename(sink.archive_path)}: {written} conversations")
+                self.count += written
+                self.bytes_written += sink.bytes_written
+                dead += sink.index.dead_bytes()
+        except BaseException:
+            for name in names:
+                self.shards[name].abort()
+            raise
+
+        if self.append:
+            self.log(f"Appended {self.count} conversations to {touched} of "
+                     f"{len(set(self.existing) | set(self.shards))} shards in {self.directory}")
+            if dead:
+                self.log(f"  Run 'compact {self.directory}' to reclaim {dead:,} bytes of tombstones")
+        else:
+            for name in self.existing:
+                if name not in self.shards:
+                    for path in (self._path(name), self._path(name) + INDEX_SUFFIX):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self.log(f"Wrote {self.count} conversations to {touched} shards in {self.directory}")
+        return self.count
+
+    def abort(self):
+        for sink in self.shards.values():
+            sink.abort()
+
+
+class SQLiteSink(OutputSink):
+    """SQLite database of conversations and messages with FTS5 search, written in batches"""
+
+    name = 'sqlite'
+    renders = False
+
+    def __init__(self, db_path, all_branches=False, batch_size=SQLITE_BATCH_SIZE):
+        super().__init__()
+        self.db_path = db_path
+        self.all_branches = all_branches
+        self.batch_size = batch_size
+        self.db = None
+        self.versions = {}
+        self.conversation_rows = []
+        self.message_rows = []
+        self.updated = 0
+
+    def open(self, log=print, stats=None):
+        super().open(log, stats)
+        self.db = ConversationDB(self.db_path)
+        if not self.db.has_fts:
+            log(f"Warning: SQLite has no FTS5 support; {self.db_path} will not be searchable")
+        self.versions = self.db.versions()
+        self.updated = 0
+
+    def wants(self, record):
+        stored = self.versions.get(record.id)
+        return stored is None or not source_unchanged(*stored, record)
+
+    def write(self, record):
+        conversation = record.conversation
+        count = 0
+        for position, message in enumerate(iter_messages(conversation, self.all_branches)):
+            self.message_rows.append((record.id, position, message['role'],
+                                      message['create_time'], message['model'], message['text']))
+            self.bytes_written += len(message['text'])
             count += 1
+        self.conversation_rows.append((
+            record.id, conversation.get('title'), conversation.get('create_time'),
+            conversation.get('update_time'), conversation.get('default_model_slug'),
+            record.digest, count,
+        ))
+        if record.id in self.versions:
+            self.updated += 1
+        if len(self.conversation_rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.conversation_rows:
+            with self.stats.stage('sqlite commit'):
+                self.db.upsert(self.conversation_rows, self.message_rows)
+            self.count += len(self.conversation_rows)
+            self.conversation_rows = []
+            self.message_rows = []
+
+    def close(self):
+        self._flush()
+        self.db.close()
+        self.log(f"Stored {self.count} conversations in {self.db_path} "
+                 f"({self.count - self.updated} new, {self.updated} updated)")
+        return self.count
+
+    def abort(self):
+        # Keep complete batches; a re-run skips what was stored
+        if self.db is not None:
+            self._flush()
+            self.db.close()
+
+
+class JSONLSink(OutputSink):
+    """JSON lines of role-tagged messages, optionally chunked, in size-rotated part files"""
+
+    name = 'jsonl'
+    renders = False
+
+    def __init__(self, output_dir, chunk_tokens=None, chunk_overlap=0, part_bytes=JSONL_PART_BYTES,
+                 all_branches=False):
+        super().__init__()
+        self.output_dir = output_dir
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.part_bytes = part_bytes
+        self.all_branches = all_branches
+        self.file = None
+        self.part = 0
+        self.part_size = 0
+        self.records = 0
+
+    def _part_path(self, number):
+        return os.path.join(self.output_dir, JSONL_PART_NAME.format(number))
+
+    def open(self, log=print, stats=None):
+        super().open(log, stats)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.part = 0
+        self.records = 0
+
+    def write(self, record):
+        conversation = record.conversation
+        header = {
+            'id': record.id,
+            'title': conversation.get('title'),
+            'create_time': conversation.get('create_time'),
+            'update_time': conversation.get('update_time'),
+            'model': conversation.get('default_model_slug'),
+        }
+        messages = list(iter_messages(conversation, self.all_branches))
+        if self.chunk_tokens:
+            windows = list(chunk_messages(messages, self.chunk_tokens, self.chunk_overlap))
+            for number, (window, tokens) in enumerate(windows):
+                self._write_line(dict(header, chunk=number, chunks=len(windows), tokens=tokens,
+                                      messages=window))
+        else:
+            self._write_line(dict(header, messages=messages))
+        self.count += 1
+
+    def _write_line(self, data):
+        if self.file is None:
+            self.part += 1
+            self.part_size = 0
+            self.file = open(self._part_path(self.part) + '.tmp', 'wb')
+        line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        self.file.write(line)
+        self.part_size += len(line)
+        self.bytes_written += len(line)
+        self.records += 1
+        if self.part_size >= self.part_bytes:
+            self._finish_part()
+
+    def _finish_part(self):
+        self.file.close()
+        self.file = None
+        os.replace(self._part_path(self.part) + '.tmp', self._part_path(self.part))
+
+    def close(self):
+        if self.file is not None:
+            self._finish_part()
+        number = self.part + 1
+        while os.path.exists(self._part_path(number)):
+            os.remove(self._part_path(number))
+            number += 1
+        self.log(f"Wrote {self.count} conversations as {self.records} JSONL records "
+                 f"in {self.part} parts in {self.output_dir}")
+        return self.count
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self._part_path(self.part) + '.tmp')
+
+
+def _iter_items(conversations):
+    """Accept either a dict of conversations or an iterable of (id, conversation) pairs"""
+    if isinstance(conversations, dict):
+        return iter(conversations.items())
+    return iter(conversations)
+
+
+def _batched(items, size):
+    """Group an iterable into lists of up to size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _render_batch(render, conversations):
+    """Render conversations to (text, wall, cpu, error); runs in worker processes"""
+    results = []
+    for conversation in conversations:
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            text, error = render(conversation), None
         except Exception as e:
-            print(f"Error writing {filename}: {e}")
+            text, error = None, f"{type(e).__name__}: {e}"
+        results.append((text, time.perf_counter() - wall, time.process_time() - cpu, error))
+    return results
+
+
+def _timed_items(conversations_data, stats):
+    """Iterate (id, conversation) pairs, charging the time spent to the parse stage"""
+    iterator = _iter_items(conversations_data)
+    while True:
+        started = stats.start()
+        item = next(iterator, None)
+        stats.add('parse', started)
+        if item is None:
+            return
+        yield item
+
+
+def _iter_rendered(records, render, workers, stats, chunk_size=RENDER_CHUNK_SIZE):
+    """Yield (record, render_seconds) in input order, with text filled in for those a sink renders
 
-    print(f"Extracted {count} conversations to {output_dir}/")
+    With workers > 1, chunks of conversations are rendered in a process pool.
+    At most two chunks per worker are in flight, so memory stays bounded
+    while streaming, and results are consumed in submission order so output
+    is identical to the serial path.
+    """
+    def finish(batch, todo, results):
+        seconds = dict.fromkeys(map(id, batch), 0.0)
+        for record, (text, wall, cpu, error) in zip(todo, results):
+            stats.add_time('render', wall, cpu)
+            record.text = text
+            record.error = error
+            seconds[id(record)] = wall
+        return [(record, seconds[id(record)]) for record in batch]
 
+    if workers <= 1:
+        for batch in _batched(records, chunk_size):
+            todo = [r for r in batch if any(s.renders for s in r.sinks)]
+            yield from finish(batch, todo, _render_batch(render, [r.conversation for r in todo]))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def collect():
+            batch, todo, future = pending.popleft()
+            started = stats.start()
+            results = future.result()
+            stats.add('wait for workers', started)
+            return finish(batch, todo, results)
+
+        for batch in _batched(records, chunk_size):
+            todo = [r for r in batch if any(s.renders for s in r.sinks)]
+            future = pool.submit(_render_batch, render, [r.conversation for r in todo])
+            pending.append((batch, todo, future))
+            if len(pending) >= workers * 2:
+                yield from collect()
+        while pending:
+            yield from collect()
+
+
+def run_pipeline(conversations_data, sinks, workers=1, all_branches=False, render=None,
+                 log=print, progress=None, stats=None, cancel=None):
+    """Render each conversation once and fan it out to every sink that wants it
+
+    conversations_data is a dict or an iterable of (id, conversation) or
+    (id, conversation, SourceSpan) tuples, typically iter_export() so the
+    export is streamed in a single pass. iter_export_cached() adds a loader
+    as a fourth element; those conversations are only decoded if a sink
+    wants them.
+    render defaults to extract_conversation_text. progress, if given, is
+    called as progress(phase, done, total): ('read', conversations so far,
+    None) while streaming, then ('write <sink>', done, total) from sinks
+    that finish their output in close(). Pass a RunStats to collect
+    per-stage timings.
+    cancel is an optional threading.Event; once set, the run stops before
+    the next conversation, every sink is aborted and PipelineCancelled is
+    raised. Outputs are only finished once streaming completes, so a
+    cancelled run never leaves a half-written archive.
+    Returns the number of conversations read.
+    """
+    if render is None:
+        render = partial(extract_conversation_text, all_branches=all_branches)
+    if stats is None:
+        stats = RunStats()
+
+    for sink in sinks:
+        if progress:
+            sink.progress = partial(progress, f"write {sink.name}")
+
+        with stats.stage(f"open {sink.name}"):
+            sink.open(log, stats)
+
+    def route(items):
+        for item in items:
+            record = ConversationRecord(*item)
+            started = stats.start()
+            record.sinks = [s for s in sinks if s.wants(record)]
+            stats.add('route', started)
+            if record.loader is not None and record.sinks:
+                started = stats.start()
+                record.conversation = record.loader()
+                stats.add('decode span', started)
+            record.loader = None
+            yield record
+
+    try:
+        records = route(_timed_items(conversations_data, stats))
+        for record, seconds in _iter_rendered(records, render, workers, stats):
+            if cancel is not None and cancel.is_set():
+                raise PipelineCancelled(f"Cancelled after {stats.conversations} conversations")
+            stats.conversations += 1
+            if record.error:
+                log(f"Error rendering conversation {record.id}: {record.error}")
+            elif record.sinks:
+                stats.rendered += 1
+                for sink in record.sinks:
+                    started = stats.start()
+                    sink.write(record)
+                    seconds += time.perf_counter() - started[0]
+                    stats.add(f"write {sink.name}", started)
+                stats.record_conversation(record.id, record.conversation.get('title'), seconds)
+            if progress:
+                progress('read', stats.conversations, None)
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+
+    for sink in sinks:
+        with stats.stage(f"close {sink.name}"):
+            sink.close()
+    stats.finish(sinks)
+
+    if workers > 1:
+        # Serially, the time spent waiting on workers would instead be
+        # spent rendering every conversation on this core
+        wait = stats.stages.get('wait for workers', [0.0])[0]
+        render_seconds = stats.stages.get('render', [0.0])[0]
+        serial = stats.wall - wait + render_seconds
+        speedup = serial / stats.wall if stats.wall else 0.0
+        log(f"Rendered on {workers} workers in {stats.wall:.2f}s "
+            f"(serial estimate {serial:.2f}s, {speedup:.1f}x speedup)")
+    return stats.conversations
+
+
+def merge_exports(input_files, archive_path, append=True, update=False, filter_func=None,
+                  workers=1, log=print, stats=None, sort_memory=DEFAULT_SORT_MEMORY,
+                  frame_entries=FRAME_ENTRIES):
+    """Merge several exports into one newest-first archive, keeping the latest version of each ID
+
+    The first pass reads only metadata (through each export's metadata
+    cache) to pick, for every conversation ID, the export holding the
+    version with the latest update_time; ties go to the later export. The
+    second pass decodes and renders just those versions, one export at a
+    time, into per-export runs that ArchiveSink k-way merges. Memory is
+    bounded by the per-conversation metadata, not the size of the exports.
+    filter_func applies to the chosen versions. Returns the number of
+    conversations written.
+    """
+    winners = {}  # conversation_id -> (update_time, export number)
+    total = 0
+    for number, input_file in enumerate(input_files):
+        count = 0
+        for item in iter_export_cached(input_file, log=log):
+            count += 1
+            update_time = item[1].get('update_time') or 0
+            best = winners.get(item[0])
+            if best is None or update_time >= best[0]:
+                winners[item[0]] = (update_time, number)
+        log(f"{input_file}: {count} conversations")
+        total += count
+    log(f"{len(winners)} unique conversations across {len(input_files)} exports "
+        f"({total - len(winners)} duplicates)")
+
+    def chosen():
+        for number, input_file in enumerate(input_files):
+            for item in iter_export_cached(input_file, filter_func, log):
+                if winners[item[0]][1] == number:
+                    yield item
+
+    runs = {conversation_id: number for conversation_id, (_, number) in winners.items()}
+    sink = ArchiveSink(archive_path, append, update, runs=runs, sort_memory=sort_memory,
+                       frame_entries=frame_entries)
+    run_pipeline(chosen(), [sink], workers=workers, log=log, stats=stats)
+    return sink.count
+
+
+def write_archive(conversations_data, archive_path, append=True, log=print, all_branches=False,
+                  shard=None):
+    """Write conversations to archive file
+
+    shard ('month', 'year' or a size in bytes) writes a sharded archive
+    instead; see ShardedArchiveSink.
+    """
+    if shard:
+        sink = ShardedArchiveSink(archive_path, shard, append)
+    else:
+        sink = ArchiveSink(archive_path, append)
+    run_pipeline(conversations_data, [sink], all_branches=all_branches, log=log)
+    return sink.count
+
+
+def write_individual_files(conversations_data, output_dir, log=print, workers=1,
+                           all_branches=False, io_threads=DEFAULT_IO_THREADS, layout='flat'):
+    """Write each conversation to individual text file"""
+    sink = IndividualFilesSink(output_dir, io_threads=io_threads, layout=layout)
+    run_pipeline(conversations_data, [sink], workers=workers, all_branches=all_branches, log=log)
+    return sink.count
+
+
+class _JSONStreamReader:
+    """Incremental UTF-8 reader over a binary stream that tracks byte offsets"""
+
+    def __init__(self, stream, chunk_size=STREAM_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0  # Byte offset of buf[pos] in the stream
+        self.started = False
+        self.eof = False
+
+    def fill(self, size=None):
+        """Append more decoded text to the buffer, dropping what was consumed"""
+        if self.eof:
+            return False
+        size = size or self.chunk_size
+        if not self.started:
+            self.started = True
+            data = self.stream.read(max(size, len(codecs.BOM_UTF8)))
+            # Skip a UTF-8 byte order mark but count it in the offsets
+            if data.startswith(codecs.BOM_UTF8):
+                self.offset = len(codecs.BOM_UTF8)
+                text = self.decoder.decode(data[len(codecs.BOM_UTF8):])
+            else:
+                text = self.decoder.decode(data)
+        else:
+            data = self.stream.read(size)
+            text = self.decoder.decode(data, final=not data)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return bool(data)
+
+    def advance(self, end):
+        """Move past buf[pos:end] and return it encoded"""
+        raw = self.buf[self.pos:end].encode('utf-8')
+        self.offset += len(raw)
+        self.pos = end
+        return raw
+
+    def skip_whitespace(self):
+        """Skip to the next significant character; False at end of stream"""
+        while True:
+            end = _WHITESPACE.match(self.buf, self.pos).end()
+            self.advance(end)
+            if self.pos < len(self.buf):
+                return True
+            if not self.fill():
+                return False
+
+    def peek(self):
+        """Return the next significant character without consuming it"""
+        if not self.skip_whitespace():
+            raise json.JSONDecodeError("Unexpected end of data", self.buf, self.pos)
+        return self.buf[self.pos]
+
+    def expect(self, char):
+        """Consume char after optional whitespace"""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r} delimiter", self.buf, self.pos)
+        self.advance(self.pos + 1)
+
+    def decode_value(self):
+        """Decode the JSON value at pos, reading more data until it is complete"""
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer is worth
+                # reading more for; a syntax error earlier on is final
+                cut_off = (e.pos >= len(self.buf) - _MAX_PARTIAL_TOKEN
+                           or e.msg.startswith('Unterminated'))
+                if not cut_off or not self.fill(size):
+                    raise
+                # Grow reads geometrically so a huge value is re-parsed only
+                # a logarithmic number of times
+                size *= 2
+                continue
+            # A bare number running up to the end of the buffer may continue in
+            # the next chunk, even if what was read so far decodes ('1' of '1.5')
+            if (not isinstance(value, (dict, list, str)) and _NUMBER_TAIL.match(self.buf, end)
+                    and self.fill(size)):
+                continue
+            return value, end
+
+
+def iter_json_items(stream, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield (key, value, start, end, raw) for each element of a top-level JSON array or object
+
+    Only one element is decoded and held in memory at a time. key is None
+    for array elements; start and end are byte offsets of the value within
+    the stream and raw is its UTF-8 source text.
+    """
+    reader = _JSONStreamReader(stream, chunk_size)
+    opener = reader.peek()
+    if opener not in '[{':
+        raise json.JSONDecodeError("Expecting array or object", reader.buf, reader.pos)
+    reader.advance(reader.pos + 1)
+    closer = ']' if opener == '[' else '}'
+
+    first = True
+    while True:
+        if reader.peek() == closer:
+            reader.advance(reader.pos + 1)
+            return
+        if not first:
+            reader.expect(',')
+        first = False
+
+        key = None
+        if opener == '{':
+            reader.peek()
+            key, end = reader.decode_value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("Expecting property name", reader.buf, reader.pos)
+            reader.advance(end)
+            reader.expect(':')
+
+        reader.peek()
+        start = reader.offset
+        value, end = reader.decode_value()
+        raw = reader.advance(end)
+        yield key, value, start, reader.offset, raw
+
+
+def generate_conversation_id(conversation):
+    """Generate a stable ID from create_time and title for list-format exports"""
+    title = conversation.get('title', 'untitled')
+    create_time = conversation.get('create_time', 0)
+    id_string = f"{create_time}_{title}"
+    return hashlib.sha256(id_string.encode()).hexdigest()[:16]
+
+
+# Byte range of a conversation in the export it was read from, and its conversation_digest
+SourceSpan = namedtuple('SourceSpan', 'start end digest')
+
+# Name of the conversations file inside the ZIP that OpenAI's data export produces
+EXPORT_MEMBER = 'conversations.json'
+
+
+def find_export_member(zf):
+    """Pick conversations.json out of an export ZIP, preferring the shallowest match"""
+    candidates = [name for name in zf.namelist() if name.rsplit('/', 1)[-1] == EXPORT_MEMBER]
+    if not candidates:
+        raise ValueError(f"{zf.filename} does not contain {EXPORT_MEMBER}")
+    return min(candidates, key=lambda name: (name.count('/'), name))
+
+
+@contextmanager
+def open_export(input_file):
+    """Open an export for binary reading: conversations.json itself or the export ZIP
+
+    ZIP members are decompressed as they are read, so nothing is extracted
+    to disk.
+    """
+    if zipfile.is_zipfile(input_file):
+        with zipfile.ZipFile(input_file) as zf:
+            with zf.open(find_export_member(zf)) as stream:
+                yield stream
+    else:
+        with open(input_file, 'rb') as f:
+            yield f
+
+
+def parse_time_arg(value, end=False):
+    """Parse a --since/--until value into a Unix timestamp
+
+    Accepts YYYY-MM-DD, an ISO date-time, or Nd for N days ago. With end
+    set, a bare date means the end of that day, so --until is inclusive.
+    """
+    value = value.strip()
+    match = re.fullmatch(r'(\d+)d', value)
+    if match:
+        return (datetime.now() - timedelta(days=int(match.group(1)))).timestamp()
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' (use YYYY-MM-DD, an ISO date-time or Nd)")
+    if end and len(value) == 10:
+        when += timedelta(days=1)
+    return when.timestamp()
+
+
+class ConversationFilter:
+    """Predicate selecting conversations by time range, title, model and length
+
+    Top-level fields are checked before messages are counted; since is
+    inclusive and until exclusive.
+    """
+
+    def __init__(self, since=None, until=None, time_field='create', title=None, models=None,
+                 min_messages=None, all_branches=False):
+        self.since = since
+        self.until = until
+        self.time_key = f"{time_field}_time"
+        self.title = re.compile(title, re.IGNORECASE) if title else None
+        self.models = set(models) if models else None
+        self.min_messages = min_messages
+        self.all_branches = all_branches
+        self.kept = 0
+        self.rejected = 0
+
+    def __bool__(self):
+        return any(value is not None for value in
+                   (self.since, self.until, self.title, self.models, self.min_messages))
+
+    def __call__(self, conversation):
+        return self._count(self._matches(conversation))
+
+    def match_metadata(self, meta):
+        """Apply the filter to a cached ConversationMeta without decoding the conversation"""
+        messages = meta.messages_all if self.all_branches else meta.messages
+        return self._count(self._matches(_meta_stub(meta), messages))
+
+    def _count(self, kept):
+        if kept:
+            self.kept += 1
+        else:
+            self.rejected += 1
+        return kept
+
+    def _matches(self, conversation, message_count=None):
+        if self.since is not None or self.until is not None:
+            when = conversation.get(self.time_key)
+            if not isinstance(when, (int, float)):
+                return False
+            if self.since is not None and when < self.since:
+                return False
+            if self.until is not None and when >= self.until:
+                return False
+        if self.title and not self.title.search(conversation.get('title') or ''):
+            return False
+        if self.models and conversation.get('default_model_slug') not in self.models:
+            return False
+        if self.min_messages and message_count is not None:
+            return message_count >= self.min_messages
+        if self.min_messages:
+            # Every message is a mapping node, so a small mapping rules it out unwalked
+            if len(conversation.get('mapping') or ()) < self.min_messages:
+                return False
+            count = 0
+            for _ in iter_messages(conversation, self.all_branches):
+                count += 1
+                if count >= self.min_messages:
+                    break
+            else:
+                return False
+        return True
+
+
+def export_size(input_file):
+    """Uncompressed size in bytes of the conversations.json stream in an export"""
+    if zipfile.is_zipfile(input_file):
+        with zipfile.ZipFile(input_file) as zf:
+            return zf.getinfo(find_export_member(zf)).file_size
+    return os.path.getsize(input_file)
+
+
+def iter_export(input_file, with_source=False, filter_func=None):
+    """Stream (conversation_id, conversation) pairs from a conversations.json export or ZIP
+
+    Handles both list (array) and dict formats. List entries get IDs
+    generated from create_time + title so they stay stable across exports.
+    With with_source, yields (conversation_id, conversation, SourceSpan)
+    so sinks can tell unchanged conversations apart by content hash.
+    filter_func, e.g. a ConversationFilter, drops conversations as soon as
+    they are decoded, before they are hashed or given an ID.
+    """
+    with open_export(input_file) as f:
+        for key, conversation, start, end, raw in iter_json_items(f):
+            if not isinstance(conversation, dict):
+                continue
+            if filter_func is not None and not filter_func(conversation):
+                continue
+            conv_id = key if key is not None else generate_conversation_id(conversation)
+            if with_source:
+                yield conv_id, conversation, SourceSpan(start, end, conversation_digest(conversation))
+            else:
+                yield conv_id, conversation
+
+
+def conversation_metadata(conversation_id, conversation, source):
+    """ConversationMeta for the export cache"""
+    return ConversationMeta(
+        conversation_id, source.start, source.end, source.digest,
+        conversation.get('title'), conversation.get('create_time'),
+        conversation.get('update_time'), conversation.get('default_model_slug'),
+        sum(1 for _ in iter_messages(conversation)),
+        sum(1 for _ in iter_messages(conversation, all_branches=True)),
+    )
+
+
+def _decode_span(stream, start, end):
+    """Decode one conversation from its byte range in the export stream"""
+    stream.seek(start)
+    return json.loads(stream.read(end - start).decode('utf-8'))
+
+
+def _meta_stub(meta):
+    """The top-level fields of a cached conversation, standing in until it is decoded"""
+    return {'title': meta.title, 'create_time': meta.create_time,
+            'update_time': meta.update_time, 'default_model_slug': meta.model}
+
+
+def iter_export_cached(input_file, filter_func=None, log=print):
+    """iter_export(with_source=True) backed by the export's metadata cache
+
+    With a valid cache, yields (conversation_id, stub, SourceSpan, loader)
+    straight from the cache: stub holds the top-level fields and loader()
+    decodes just that conversation's byte range, reading the export
+    forward (a ZIP member is decompressed up to the span rather than
+    seeked). Filters are answered from the cache, so conversations no
+    sink wants are never decoded. Without one, the export is streamed as
+    usual and the cache is written once the whole export has been read.
+    """
+    cache = ExportCache.load(input_file)
+    if cache is not None:
+        match = getattr(filter_func, 'match_metadata', None)
+        with open_export(input_file) as f:
+            for meta in cache:
+                stub = _meta_stub(meta)
+                if filter_func is not None and not (match(meta) if match else filter_func(stub)):
+                    continue
+                yield (meta.id, stub, SourceSpan(meta.start, meta.end, meta.digest),
+                       partial(_decode_span, f, meta.start, meta.end))
+        return
+
+    log(f"Building export cache {input_file + CACHE_SUFFIX}")
+    cache = ExportCache(input_file)
+    cache.take_stamp()
+    for conversation_id, conversation, source in iter_export(input_file, with_source=True):
+        cache.add(conversation_metadata(conversation_id, conversation, source))
+        if filter_func is None or filter_func(conversation):
+            yield conversation_id, conversation, source
+    try:
+        cache.save()
+    except OSError as e:
+        log(f"Warning: Could not save export cache: {e}")
+
+
+def fetch_from_archive(archive_path, conversation_ids, output=None, log=print):
+    """Write the archive entries for conversation_ids to output (default stdout)
+
+    Uses the sidecar index to seek straight to each entry. archive_path
+    may also be the directory of a sharded archive, whose shard indexes
+    are all searched. Entries are written without their checksum trailers,
+    each followed by a blank line. Returns the number of IDs that were not
+    found.
+    """
+    if os.path.isdir(archive_path):
+        indexes = [ArchiveIndex.load(path, log) for path in list_shards(archive_path)]
+    else:
+        indexes = [ArchiveIndex.load(archive_path, log)]
+    found = {}
+    for index in indexes:
+        found.update(index.iter_entries([cid for cid in conversation_ids if cid in index]))
+
+    out = output or sys.stdout.buffer
+    missing = 0
+    for conversation_id in conversation_ids:
+        entry = found.get(conversation_id)
+        if entry is None:
+            log(f"Not found in {archive_path}: {conversation_id}")
+            missing += 1
+        else:
+            out.write(entry_body(entry) + b'\n')
+    out.flush()
+    return missing
+
+
+def _read_ids_file(path):
+    """Conversation IDs from a file, one per line ('-' reads stdin)"""
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def _run_fetch(archive_path, conversation_ids, ids_file=None, output_path=None):
+    """Shared body of the get command and --extract-id"""
+    conversation_ids = list(conversation_ids or [])
+    if ids_file:
+        conversation_ids.extend(_read_ids_file(ids_file))
+    if not conversation_ids:
+        print("Error: No conversation IDs given", file=sys.stderr)
+        return 1
+    if not os.path.exists(archive_path):
+        print(f"Error: Could not find {archive_path}", file=sys.stderr)
+        return 1
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    if output_path:
+        with open(output_path, 'wb') as out:
+            missing = fetch_from_archive(archive_path, conversation_ids, out, log)
+        log(f"Wrote {len(conversation_ids) - missing} conversations to {output_path}")
+    else:
+        missing = fetch_from_archive(archive_path, conversation_ids, log=log)
+    return 1 if missing else 0
+
+
+def get_main(argv):
+    """extractor.py get: print archive entries by conversation ID"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py get',
+        description='Fetch conversations from an archive by ID using its sidecar index'
+    )
+    parser.add_argument('ids', nargs='*', metavar='conversation_id', help='Conversation IDs to fetch')
+    parser.add_argument('--archive', '-a', default='chatgpt_archive.txt',
+                        help='Archive file, or sharded archive directory, to read '
+                             '(default: chatgpt_archive.txt)')
+    parser.add_argument('--ids-file', metavar='PATH',
+                        help="Read more IDs from PATH, one per line ('-' for stdin)")
+    parser.add_argument('--output', '-o', metavar='PATH', help='Write entries to PATH instead of stdout')
+    args = parser.parse_args(argv)
+    return _run_fetch(args.archive, args.ids, args.ids_file, args.output)
+
+
+def compact_main(argv):
+    """extractor.py compact: drop tombstoned entries from an archive"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py compact',
+        description='Rewrite an archive without the old versions left behind by --update'
+    )
+    parser.add_argument('archive', nargs='?', default='chatgpt_archive.txt',
+                        help='Archive file, or sharded archive directory, to compact '
+                             '(default: chatgpt_archive.txt)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.archive):
+        print(f"Error: Could not find {args.archive}")
+        return 1
+    paths = list_shards(args.archive) if os.path.isdir(args.archive) else [args.archive]
+    reclaimed = 0
+    for path in paths:
+        index = ArchiveIndex.load(path)
+        dead = index.dead_bytes()
+        if dead:
+            print(f"Compacting {path}: {len(index)} live conversations, {dead:,} bytes of tombstones")
+            reclaimed += index.compact()
+    if not reclaimed:
+        print(f"{args.archive} has no tombstones; nothing to do")
+        return 0
+    print(f"Reclaimed {reclaimed:,} bytes")
+    return 0
+
+
+def merge_main(argv):
+    """extractor.py merge: combine several exports into one archive"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py merge',
+        description='Merge several conversations.json exports or ZIPs into one newest-first '
+                    'archive, keeping the latest version of each conversation'
+    )
+    parser.add_argument('input_files', nargs='+', metavar='input_file',
+                        help='Exports to merge, conversations.json or ZIP')
+    parser.add_argument('--archive', '-a', default='chatgpt_archive.txt',
+                        help='Archive file to write (default: chatgpt_archive.txt)')
+    parser.add_argument('--no-append', action='store_true',
+                        help='Create fresh archive instead of appending')
+    parser.add_argument('--update', action='store_true',
+                        help='Also append new versions of conversations already in the archive')
+    parser.add_argument('--workers', '-w', type=int, default=1, metavar='N',
+                        help='Render conversations in N worker processes (0 = one per CPU core)')
+    parser.add_argument('--sort-memory', type=int, default=DEFAULT_SORT_MEMORY >> 20, metavar='MB',
+                        help='Memory for sorting archive entries before spilling sorted runs to '
+                             f'disk (default: {DEFAULT_SORT_MEMORY >> 20})')
+    parser.add_argument('--frame-size', type=int, default=FRAME_ENTRIES, metavar='N',
+                        help=f'Conversations per compressed frame for .gz/.xz/.zst archives '
+                             f'(default: {FRAME_ENTRIES})')
+    add_filter_arguments(parser)
+    parser.add_argument('--stats', action='store_true',
+                        help='Print per-stage timing, throughput and memory statistics')
+    args = parser.parse_args(argv)
+    if args.update and args.no_append:
+        parser.error('--update and --no-append cannot be used together')
+    conversation_filter = filter_from_args(parser, args)
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+
+    stats = RunStats()
+    try:
+        merge_exports(args.input_files, args.archive, append=not args.no_append,
+                      update=args.update,
+                      filter_func=conversation_filter if conversation_filter else None,
+                      workers=workers, stats=stats, sort_memory=args.sort_memory << 20,
+                      frame_entries=args.frame_size)
+    except FileNotFoundError as e:
+        print(f"Error: Could not find {e.filename}")
+        return 1
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON ({e.msg})")
+        return 1
+    except (ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}")
+        return 1
+    if args.stats:
+        print('\n'.join(stats.report()))
+    return 0
+
+
+def search_main(argv):
+    """extractor.py search: full-text search of a --sqlite database"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py search',
+        description='Search the messages in a database written with --sqlite (FTS5 query syntax)'
+    )
+    parser.add_argument('database', help='SQLite database written with --sqlite')
+    parser.add_argument('query', help='FTS5 query, e.g. \'"vector index" OR faiss\'')
+    parser.add_argument('--limit', '-n', type=int, default=20,
+                        help='Maximum number of results (default: 20)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        print(f"Error: Could not find {args.database}")
+        return 1
+    db = ConversationDB(args.database)
+    try:
+        started = time.perf_counter()
+        rows = db.search(args.query, args.limit)
+        elapsed = time.perf_counter() - started
+    except (ValueError, sqlite3.OperationalError) as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        db.close()
+
+    for conversation_id, title, create_time, role, snippet in rows:
+        created = datetime.fromtimestamp(create_time).strftime('%Y-%m-%d') if create_time else 'unknown'
+        print(f"{conversation_id}  {created}  {title or 'Untitled'}")
+        print(f"    {(role or '').upper()}: {' '.join(snippet.split())}")
+    print(f"{len(rows)} results in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+def add_filter_arguments(parser):
+    """Add the conversation filter options shared by extraction and list"""
+    parser.add_argument('--since', metavar='DATE',
+                        help='Only conversations from DATE on (YYYY-MM-DD, ISO date-time or Nd ago)')
+    parser.add_argument('--until', metavar='DATE',
+                        help='Only conversations up to and including DATE')
+    parser.add_argument('--time-field', choices=['create', 'update'], default='create',
+                        help='Timestamp --since/--until compare against (default: create)')
+    parser.add_argument('--title', metavar='REGEX',
+                        help='Only conversations whose title matches REGEX (case-insensitive)')
+    parser.add_argument('--model', metavar='SLUG[,SLUG]',
+                        help='Only conversations whose default model is one of these slugs')
+    parser.add_argument('--min-messages', type=int, metavar='N',
+                        help='Only conversations with at least N messages')
+
+
+def filter_from_args(parser, args, all_branches=False):
+    """Build a ConversationFilter from add_filter_arguments options, exiting on bad values"""
+    try:
+        return ConversationFilter(
+            since=parse_time_arg(args.since) if args.since else None,
+            until=parse_time_arg(args.until, end=True) if args.until else None,
+            time_field=args.time_field,
+            title=args.title,
+            models=[m.strip() for m in args.model.split(',')] if args.model else None,
+            min_messages=args.min_messages,
+            all_branches=all_branches,
+        )
+    except re.error as e:
+        parser.error(f"invalid --title pattern: {e}")
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def list_main(argv):
+    """extractor.py list: list the conversations in an export"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py list',
+        description='List the conversations in an export, answered from its metadata cache'
+    )
+    parser.add_argument('input_file', help='Path to conversations.json or the export ZIP')
+    add_filter_arguments(parser)
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per line')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'Parse the whole export instead of using INPUT{CACHE_SUFFIX}')
+    args = parser.parse_args(argv)
+    conversation_filter = filter_from_args(parser, args)
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    try:
+        if args.no_cache:
+            metas = (conversation_metadata(conversation_id, conversation, source)
+                     for conversation_id, conversation, source
+                     in iter_export(args.input_file, with_source=True))
+        else:
+            cache = ExportCache.load(args.input_file)
+            if cache is None:
+                # Reading the export through iter_export_cached writes the cache
+                for _ in iter_export_cached(args.input_file, log=log):
+                    pass
+                cache = ExportCache.load(args.input_file) or []
+            metas = iter(cache)
+
+        count = 0
+        for meta in metas:
+            if conversation_filter and not conversation_filter.match_metadata(meta):
+                continue
+            count += 1
+            if args.json:
+                print(json.dumps(meta._asdict(), ensure_ascii=False))
+            else:
+                created = (datetime.fromtimestamp(meta.create_time).strftime('%Y-%m-%d %H:%M')
+                           if meta.create_time else 'unknown')
+                print(f"{meta.id}\t{created}\t{meta.messages:>4}\t{meta.title or 'Untitled'}")
+    except FileNotFoundError:
+        log(f"Error: Could not find {args.input_file}")
+        return 1
+    except json.JSONDecodeError as e:
+        log(f"Error: {args.input_file} is not valid JSON ({e.msg})")
+        return 1
+    except (ValueError, zipfile.BadZipFile) as e:
+        log(f"Error: {e}")
+        return 1
+    log(f"{count} conversations")
+    return 0
+
+
+class InboxWatcher:
+    """Run an extraction on every export that settles in an inbox directory, one at a time"""
+
+    def __init__(self, inbox, extract_args, interval=WATCH_INTERVAL, settle=WATCH_SETTLE,
+                 state_path=None, log=print):
+        self.inbox = inbox
+        self.extract_args = list(extract_args)
+        self.interval = interval
+        self.settle = settle
+        self.state_path = state_path or os.path.join(inbox, WATCH_STATE_FILENAME)
+        self.log = log
+        self.state = {}  # file name -> {'size', 'mtime_ns', 'status', 'processed'}
+        self.arriving = {}  # file name -> ((size, mtime_ns), monotonic time first seen so)
+        self.queued = set()
+        self.jobs = queue.Queue()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def save_state(self):
+        with atomic_write(self.state_path) as f:
+            json.dump(self.state, f, indent=1, ensure_ascii=False)
+
+    def poll(self):
+        """Check the inbox once and queue the exports that finished arriving"""
+        now = time.monotonic()
+        present = set()
+        for name in sorted(os.listdir(self.inbox)):
+            if name.startswith('.') or not name.lower().endswith(('.json', '.zip')):
+                continue
+            try:
+                st = os.stat(os.path.join(self.inbox, name))
+            except OSError:
+                continue  # Moved away since the listing
+            present.add(name)
+            stamp = (st.st_size, st.st_mtime_ns)
+            done = self.state.get(name)
+            if name in self.queued or (done and (done['size'], done['mtime_ns']) == stamp):
+                continue
+            seen = self.arriving.get(name)
+            if seen is None or seen[0] != stamp:
+                self.arriving[name] = (stamp, now)
+            elif now - seen[1] >= self.settle:
+                del self.arriving[name]
+                self.queued.add(name)
+                self.log(f"Queued {name} ({stamp[0]:,} bytes)")
+                self.jobs.put((name, stamp))
+        for name in set(self.arriving) - present:
+            del self.arriving[name]
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            name, (size, mtime_ns) = job
+            self.log(f"Processing {name}")
+            started = time.perf_counter()
+            try:
+                status = main([os.path.join(self.inbox, name)] + self.extract_args)
+            except SystemExit as e:
+                status = e.code
+            except Exception as e:
+                self.log(f"Error processing {name}: {e}")
+                status = 1
+            self.state[name] = {'size': size, 'mtime_ns': mtime_ns, 'status': status,
+                                'processed': datetime.now().isoformat(timespec='seconds')}
+            self.save_state()
+            self.queued.discard(name)
+            outcome = 'Finished' if not status else f"Failed (status {status})"
+            self.log(f"{outcome} {name} in {time.perf_counter() - started:.1f}s")
+
+    def run(self, once=False):
+        """Poll until interrupted, or with once set until everything present is processed"""
+        self.load_state()
+        worker = threading.Thread(target=self._work)
+        worker.start()
+        try:
+            while True:
+                self.poll()
+                if once and not self.arriving:
+                    break
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            self.log("Stopping; waiting for the current run to finish")
+            while True:
+                try:
+                    self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            self.jobs.put(None)
+            worker.join()
+
+
+def watch_main(argv):
+    """extractor.py watch: process new exports as they land in an inbox directory"""
+    parser = argparse.ArgumentParser(
+        prog='extractor.py watch',
+        usage='%(prog)s [-h] [options] inbox [-- extraction options]',
+        description='Watch a directory for new conversations.json or export ZIP files and run '
+                    'an incremental extraction on each, one at a time',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Options after -- are passed to every extraction run; the default is
+--archive --update, which appends new and changed conversations to
+chatgpt_archive.txt through its index.
+
+Examples:
+  %(prog)s inbox/
+  %(prog)s inbox/ --interval 60 -- --archive all.txt --update --cache --sqlite all.db
+        """
+    )
+    parser.add_argument('inbox', help='Directory to watch')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+                        help=f'Seconds between checks of the inbox (default: {WATCH_INTERVAL})')
+    parser.add_argument('--settle', type=float, default=WATCH_SETTLE, metavar='SECONDS',
+                        help='Seconds a file must stay the same size and mtime before it is '
+                             f'processed (default: {WATCH_SETTLE})')
+    parser.add_argument('--state', metavar='PATH',
+                        help=f'File recording processed exports (default: INBOX/{WATCH_STATE_FILENAME})')
+    parser.add_argument('--once', action='store_true',
+                        help='Process the exports already in the inbox, then exit')
+    if '--' in argv:
+        split = argv.index('--')
+        argv, extract_args = argv[:split], argv[split + 1:]
+    else:
+        extract_args = ['--archive', '--update']
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.inbox):
+        print(f"Error: {args.inbox} is not a directory")
+        return 1
+    # Catch bad extraction options now rather than on the first export
+    extraction_parser().parse_args(['INPUT'] + extract_args)
+
+    print(f"Watching {args.inbox} every {args.interval:g}s (Ctrl+C to stop)")
+    print(f"Extraction options: {' '.join(extract_args)}")
+
+    def log(message):
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+    InboxWatcher(args.inbox, extract_args, args.interval, args.settle, args.state, log).run(args.once)
+    return 0
+
+
+def serve_main(argv):
+    """extractor.py serve: read-only HTTP queries over an archive or output directory"""
+    from archive_server import DEFAULT_CACHE_BYTES, ArchiveStore, DirectoryStore, LRUCache, QueryServer
 
-def main():
+    parser = argparse.ArgumentParser(
+        prog='extractor.py serve',
+        description='Serve list, fetch and search requests over an archive, a sharded archive '
+                    'directory or an individual files output directory on a local HTTP port',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Endpoints:
+  /                                       summary and cache statistics
+  /conversations?since=&until=&title=     newest first, with limit= and offset=
+  /conversations/ID                       the conversation's text
+  /search?q=                              conversations containing q (FTS5 with --db)
+
+Examples:
+  %(prog)s chatgpt_archive.txt
+  %(prog)s chatgpt_conversations --db conversations.db --port 9000
+        """
+    )
+    parser.add_argument('source', nargs='?', default='chatgpt_archive.txt',
+                        help='Archive file, sharded archive directory or individual files output '
+                             'directory (default: chatgpt_archive.txt)')
+    parser.add_argument('--db', metavar='PATH',
+                        help='SQLite database written with --sqlite, for full-text search')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES >> 20, metavar='MB',
+                        help='Memory for cached conversations (default: '
+                             f'{DEFAULT_CACHE_BYTES >> 20})')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        print(f"Error: Could not find {args.source}")
+        return 1
+    if args.db and not os.path.exists(args.db):
+        print(f"Error: Could not find {args.db}")
+        return 1
+
+    manifest_path = os.path.join(args.source, MANIFEST_FILENAME)
+    if os.path.isfile(manifest_path):
+        # Any render settings will do; only the file paths and titles are used
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            store = DirectoryStore(args.source, json.load(f).get('conversations', {}))
+    else:
+        if os.path.isdir(args.source):
+            shards = list_shards(args.source)
+            if not shards or not all(os.path.exists(path + INDEX_SUFFIX) for path in shards):
+                # Without indexes these are more likely loose text files than shards
+                print(f"Error: {args.source} is neither a sharded archive nor an individual "
+                      f"files output directory with a manifest")
+                return 1
+        store = ArchiveStore(args.source)
+    print(f"Loaded {len(store.conversations)} conversations from {args.source}")
+
+    db = None
+    if args.db:
+        try:
+            db = ConversationDB(args.db, read_only=True)
+        except sqlite3.Error as e:
+            print(f"Error: Could not open {args.db}: {e}")
+            return 1
+
+    server = QueryServer((args.host, args.port), store, LRUCache(args.cache_mb << 20),
+                         parse_time_arg, db=db,
+                         log=lambda message: print(message, file=sys.stderr))
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}/ "
+          f"(Ctrl+C to stop)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if db is not None:
+            db.close()
+    return 0
+
+
+# Subcommands dispatched on the first argument; anything else is an input file
+COMMANDS = {
+    'get': get_main,
+    'list': list_main,
+    'compact': compact_main,
+    'merge': merge_main,
+    'search': search_main,
+    'watch': watch_main,
+    'serve': serve_main,
+}
+
+
+def extraction_parser():
+    """Argument parser for an extraction run (everything but the subcommands)"""
     parser = argparse.ArgumentParser(
         description='Extract ChatGPT conversations from conversations.json export',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -222,6 +2534,9 @@ def main():
 Examples:
   # Extract to individual files (default)
   %(prog)s conversations.json
+
+  # Read straight from the export ZIP without unpacking it
+  %(prog)s chatgpt-export.zip --archive
   
   # Create/append to archive file
   %(prog)s conversations.json --archive chatgpt_archive.txt
@@ -231,64 +2546,257 @@ Examples:
   
   # Force fresh archive (don't append)
   %(prog)s conversations.json --archive chatgpt_archive.txt --no-append
+
+  # Searchable SQLite database
+  %(prog)s conversations.json --sqlite conversations.db
+  %(prog)s search conversations.db '"vector index" OR faiss'
+
+  # JSON lines for embedding jobs: ~512-token windows overlapping by 64,
+  # in 64 MB part files
+  %(prog)s conversations.json --jsonl chatgpt_jsonl --chunk-tokens 512 --chunk-overlap 64 \\
+      --jsonl-part-size 64
+
+  # Compressed archive; append and get still work
+  %(prog)s conversations.json --archive chatgpt_archive.txt.gz
+  %(prog)s get 1a2b3c4d5e6f7a8b --archive chatgpt_archive.txt.gz
+
+  # One archive per month (chatgpt_archive/2024-05.txt, ...); appends only
+  # touch the months that changed
+  %(prog)s conversations.json --archive chatgpt_archive.txt --shard month
+  %(prog)s get 1a2b3c4d5e6f7a8b --archive chatgpt_archive
+
+  # Refresh conversations that continued since they were archived, then
+  # drop the old versions
+  %(prog)s conversations.json --archive chatgpt_archive.txt --update
+  %(prog)s compact chatgpt_archive.txt
+
+  # Only last month's conversations about Python that used GPT-4o
+  %(prog)s conversations.json --since 30d --title python --model gpt-4o
+
+  # Cache export metadata so repeated runs only decode what they write
+  %(prog)s conversations.json --cache --since 30d
+  %(prog)s list conversations.json --title python
+
+  # Pick up where a killed run stopped
+  %(prog)s conversations.json --rewrite-all --resume
+
+  # Large exports: YYYY/MM/ directories plus an index.tsv of every file
+  %(prog)s conversations.json --layout date
+
+  # Render on every CPU core
+  %(prog)s conversations.json --workers 0
+
+  # Slow or network disk: more writer threads, fsync every 100 files per thread
+  %(prog)s conversations.json --io-threads 16 --fsync-every 100
+
+  # Browse and search the archive over HTTP on localhost
+  %(prog)s serve chatgpt_archive.txt --db conversations.db
+
+  # Process each new export dropped into inbox/, appending to the archive
+  %(prog)s watch inbox/ -- --archive chatgpt_archive.txt --update --cache
+
+  # Merge years of exports into one archive, latest version of each conversation
+  %(prog)s merge export-2023.zip export-2024.zip conversations.json --archive all.txt
+
+  # Fetch conversations back out of the archive by ID
+  %(prog)s get 1a2b3c4d5e6f7a8b 9c8d7e6f5a4b3c2d --archive chatgpt_archive.txt
+  %(prog)s --extract-id 1a2b3c4d5e6f7a8b --archive chatgpt_archive.txt
+
+  # Report where the time goes, and profile the hot path
+  %(prog)s conversations.json --archive --stats --stats-json stats.json --profile run.prof
         """
     )
     
-    parser.add_argument('input_file', help='Path to conversations.json file')
+    parser.add_argument('input_file', nargs='?', help='Path to conversations.json or the export ZIP')
     parser.add_argument('--individual', '-i', action='store_true',
                         help='Output individual text files (default if no --archive)')
     parser.add_argument('--archive', '-a', nargs='?', const='chatgpt_archive.txt',
                         help='Output combined archive file (optionally specify filename)')
     parser.add_argument('--no-append', action='store_true',
                         help='Create fresh archive instead of appending')
+    parser.add_argument('--update', action='store_true',
+                        help='Also append new versions of conversations that changed since they '
+                             'were archived (see the compact command)')
+    parser.add_argument('--shard', metavar='month|year|MB',
+                        help='Split the archive into shards by creation month or year, or of '
+                             'about MB megabytes each, in a directory named after the archive')
+    parser.add_argument('--sort-memory', type=int, default=DEFAULT_SORT_MEMORY >> 20, metavar='MB',
+                        help='Memory for sorting archive entries before spilling sorted runs to '
+                             f'disk (default: {DEFAULT_SORT_MEMORY >> 20})')
+    parser.add_argument('--frame-size', type=int, default=FRAME_ENTRIES, metavar='N',
+                        help=f'Conversations per compressed frame for .gz/.xz/.zst archives '
+                             f'(default: {FRAME_ENTRIES})')
+    parser.add_argument('--sqlite', metavar='PATH',
+                        help='Store conversations and messages in a SQLite database with full-text search')
+    parser.add_argument('--jsonl', metavar='DIR',
+                        help='Write JSON lines of role-tagged messages to part files in DIR')
+    parser.add_argument('--chunk-tokens', type=int, metavar='N',
+                        help='Split JSONL records into windows of about N estimated tokens')
+    parser.add_argument('--chunk-overlap', type=int, default=0, metavar='N',
+                        help='Tokens of messages repeated at the start of each following window '
+                             '(default: 0)')
+    parser.add_argument('--jsonl-part-size', type=int, default=JSONL_PART_BYTES >> 20, metavar='MB',
+                        help=f'Start a new JSONL part file after MB megabytes '
+                             f'(default: {JSONL_PART_BYTES >> 20})')
     parser.add_argument('--output-dir', '-o', default='chatgpt_conversations',
                         help='Output directory for individual files (default: chatgpt_conversations)')
+    parser.add_argument('--layout', choices=LAYOUTS, default='flat',
+                        help='Individual files directly in the output directory (flat), in YYYY/MM/ '
+                             'directories (date) or in ID hash buckets (hash), with an index.tsv '
+                             'for nested layouts (default: flat)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run: skip the individual files its '
+                             'checkpoint journal says were written')
+    parser.add_argument('--rewrite-all', action='store_true',
+                        help='Rewrite every individual file instead of skipping unchanged ones')
+    parser.add_argument('--workers', '-w', type=int, default=1, metavar='N',
+                        help='Render conversations in N worker processes (0 = one per CPU core)')
+    parser.add_argument('--io-threads', type=int, default=DEFAULT_IO_THREADS, metavar='N',
+                        help=f'Threads writing individual files (0 = write inline, default: {DEFAULT_IO_THREADS})')
+    parser.add_argument('--write-buffer', type=int, default=WRITE_BUFFER_SIZE, metavar='BYTES',
+                        help=f'Write buffer size per file (default: {WRITE_BUFFER_SIZE})')
+    parser.add_argument('--fsync-every', type=int, default=0, metavar='N',
+                        help='fsync individual files in batches of N per I/O thread (default: never)')
+    parser.add_argument('--all-branches', action='store_true',
+                        help='Include regenerated and abandoned branches, not just the active thread')
+    add_filter_arguments(parser)
+    parser.add_argument('--cache', action='store_true',
+                        help=f'Keep a metadata cache next to the input (INPUT{CACHE_SUFFIX}) so later '
+                             'runs only decode the conversations they write')
+    parser.add_argument('--extract-id', action='append', metavar='ID',
+                        help='Print the archive entry for ID instead of extracting (repeatable)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print per-stage timing, throughput and memory statistics')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='Write run statistics as JSON to PATH')
+    parser.add_argument('--top', type=int, default=10, metavar='N',
+                        help='Number of slowest conversations to report (default: 10)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='Profile the run with cProfile and dump the stats to PATH')
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    parser = extraction_parser()
+    args = parser.parse_args(argv)
+
+    if args.extract_id:
+        archive_path = args.archive or 'chatgpt_archive.txt'
+        if args.shard:
+            archive_path = shard_location(archive_path)[0]
+        return _run_fetch(archive_path, args.extract_id)
+    if not args.input_file:
+        parser.error('the following arguments are required: input_file')
+    if args.update and args.no_append:
+        parser.error('--update and --no-append cannot be used together')
+    if args.update and not args.archive:
+        parser.error('--update needs --archive')
+    if args.shard:
+        if not args.archive:
+            parser.error('--shard needs --archive')
+        try:
+            args.shard = parse_shard_arg(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
     
-    args = parser.parse_args()
-    
-    # Default to individual files if neither mode specified
-    if not args.individual and not args.archive:
+    if args.chunk_tokens is not None:
+        if args.chunk_tokens <= 0:
+            parser.error('--chunk-tokens must be positive')
+        if not 0 <= args.chunk_overlap < args.chunk_tokens:
+            parser.error('--chunk-overlap must be at least 0 and less than --chunk-tokens')
+    elif args.chunk_overlap:
+        parser.error('--chunk-overlap needs --chunk-tokens')
+    if args.jsonl_part_size <= 0:
+        parser.error('--jsonl-part-size must be positive')
+
+    # Default to individual files if no output specified
+    if not args.individual and not args.archive and not args.sqlite and not args.jsonl:
         args.individual = True
+
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+
+    conversation_filter = filter_from_args(parser, args, args.all_branches)
+    filter_func = conversation_filter if conversation_filter else None
     
-    # Load conversations.json
+    # Stream conversations.json one conversation at a time so memory stays
+    # bounded by the largest conversation rather than the whole export
     try:
-        with open(args.input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Could not find {args.input_file}")
-        return 1
-    except json.JSONDecodeError:
-        print(f"Error: {args.input_file} is not valid JSON")
-        return 1
+        if next(iter_export(args.input_file), None) is None:
+            print("No conversations found in input file")
+            return 1
 
-    # Handle both list (array) and dict formats
-    if isinstance(data, list):
-        # Convert list to dict with generated conversation IDs
-        # Use create_time + title hash for stable IDs across exports
-        conversations = {}
-        for conv in data:
-            # Generate stable ID from create_time and title
-            title = conv.get('title', 'untitled')
-            create_time = conv.get('create_time', 0)
-            id_string = f"{create_time}_{title}"
-            conv_id = hashlib.sha256(id_string.encode()).hexdigest()[:16]
-            conversations[conv_id] = conv
-    else:
-        conversations = data
+        print(f"Streaming conversations from {args.input_file}")
+
+        # Process based on mode, rendering each conversation once for all outputs
+        render_key = render_key_for(args.all_branches)
+        sinks = []
+        if args.individual:
+            sinks.append(IndividualFilesSink(args.output_dir, incremental=not args.rewrite_all,
+                                             render_key=render_key, io_threads=args.io_threads,
+                                             write_buffer=args.write_buffer,
+                                             fsync_every=args.fsync_every, layout=args.layout,
+                                             resume=args.resume))
+        if args.archive and args.shard:
+            sinks.append(ShardedArchiveSink(args.archive, args.shard, append=not args.no_append,
+                                            update=args.update, sort_memory=args.sort_memory << 20,
+                                            frame_entries=args.frame_size))
+        elif args.archive:
+            sinks.append(ArchiveSink(args.archive, append=not args.no_append, update=args.update,
+                                     sort_memory=args.sort_memory << 20,
+                                     frame_entries=args.frame_size))
+        if args.sqlite:
+            sinks.append(SQLiteSink(args.sqlite, all_branches=args.all_branches))
+        if args.jsonl:
+            sinks.append(JSONLSink(args.jsonl, chunk_tokens=args.chunk_tokens,
+                                   chunk_overlap=args.chunk_overlap,
+                                   part_bytes=args.jsonl_part_size << 20,
+                                   all_branches=args.all_branches))
 
-    if not conversations:
-        print("No conversations found in input file")
+        stats = RunStats(top_n=args.top)
+        profiler = None
+        if args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            if args.cache:
+                conversations = iter_export_cached(args.input_file, filter_func)
+            else:
+                conversations = iter_export(args.input_file, with_source=True,
+                                            filter_func=filter_func)
+            count = run_pipeline(conversations, sinks, workers=args.workers,
+                                 all_branches=args.all_branches, stats=stats)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+                print(f"Wrote profile to {args.profile} (main process only)")
+        print(f"Processed {count} conversations from {args.input_file}")
+        if filter_func:
+            print(f"Filtered out {conversation_filter.rejected} conversations")
+
+        if args.stats:
+            print('\n'.join(stats.report()))
+        if args.stats_json:
+            with open(args.stats_json, 'w', encoding='utf-8') as f:
+                json.dump(stats.to_dict(), f, indent=2)
+            print(f"Wrote statistics to {args.stats_json}")
+    except FileNotFoundError as e:
+        print(f"Error: Could not find {e.filename or args.input_file}")
+        return 1
+    except json.JSONDecodeError as e:
+        print(f"Error: {args.input_file} is not valid JSON ({e.msg})")
+        return 1
+    except (ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}")
         return 1
 
-    print(f"Loaded {len(conversations)} conversations from {args.input_file}")
-    
-    # Process based on mode
-    if args.individual:
-        write_individual_files(conversations, args.output_dir)
-    
-    if args.archive:
-        write_archive(conversations, args.archive, append=not args.no_append)
-    
     return 0
 
 
@@ -8,205 +8,32 @@ import tkinter as tk
 from tkinter import filedialog, scrolledtext, messagebox
 from tkinter import ttk
 import os
+import re
 import sys
+import json
+import queue
 import threading
+import time
 from pathlib import Path
 
 # Import the extractor functions
-import json
-import re
-import hashlib
-from datetime import datetime
-
-
-def sanitize_filename(title, max_length=100):
-    """Convert conversation title to safe filename"""
-    safe_title = re.sub(r'[<>:"/\\|?*]', '', title)
-    safe_title = re.sub(r'\s+', '_', safe_title)
-    if len(safe_title) > max_length:
-        safe_title = safe_title[:max_length]
-    safe_title = safe_title.rstrip('. ')
-    return safe_title if safe_title else 'untitled'
-
-
-def extract_conversation_text(conversation):
-    """Extract text content from conversation structure"""
-    lines = []
-
-    title = conversation.get('title', 'Untitled Conversation')
-    lines.append(f"Title: {title}\n")
-    lines.append("=" * 80 + "\n\n")
-
-    mapping = conversation.get('mapping', {})
-
-    messages = []
-    for node_id, node in mapping.items():
-        message = node.get('message')
-        if message and message.get('content'):
-            content = message.get('content', {})
-            parts = content.get('parts', [])
-            author_role = message.get('author', {}).get('role', 'unknown')
-
-            if parts and any(parts):
-                text = '\n'.join(str(part) for part in parts if part)
-                if text.strip():
-                    messages.append({
-                        'role': author_role,
-                        'text': text,
-                        'create_time': message.get('create_time')
-                    })
-
-    messages.sort(key=lambda x: x.get('create_time', 0))
-
-    for msg in messages:
-        role = msg['role'].upper()
-        if role == 'USER':
-            lines.append(f"USER:\n{msg['text']}\n\n")
-        elif role == 'ASSISTANT':
-            lines.append(f"ASSISTANT:\n{msg['text']}\n\n")
-        elif role == 'SYSTEM':
-            lines.append(f"SYSTEM:\n{msg['text']}\n\n")
-
-    return ''.join(lines)
-
-
-def parse_existing_archive(archive_path):
-    """Parse existing archive file to extract conversation IDs"""
-    if not os.path.exists(archive_path):
-        return set()
-
-    existing_ids = set()
-    try:
-        with open(archive_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            id_matches = re.findall(r'^ID: (.+)$', content, re.MULTILINE)
-            existing_ids = set(id_matches)
-    except Exception:
-        pass
-
-    return existing_ids
-
-
-def create_archive_entry(conversation, conversation_id):
-    """Create a formatted archive entry for a conversation"""
-    title = conversation.get('title', 'Untitled Conversation')
-    create_time = conversation.get('create_time', 0)
-
-    if create_time:
-        dt = datetime.fromtimestamp(create_time)
-        timestamp = dt.isoformat()
-    else:
-        timestamp = 'Unknown'
-
-    lines = []
-    lines.append("=" * 80)
-    lines.append(f"CONVERSATION: {title}")
-    lines.append(f"Date: {timestamp}")
-    lines.append(f"ID: {conversation_id}")
-    lines.append("=" * 80)
-    lines.append("")
-
-    content = extract_conversation_text(conversation)
-    lines.append(content)
-
-    lines.append("=" * 80)
-    lines.append("")
-
-    return '\n'.join(lines)
-
-
-def write_archive(conversations_data, archive_path, append=True, log_callback=None):
-    """Write conversations to archive file"""
-    existing_ids = set()
-    if append:
-        existing_ids = parse_existing_archive(archive_path)
-        if log_callback:
-            log_callback(f"Found {len(existing_ids)} existing conversations in archive\n")
-
-    all_conversations = []
-
-    for conv_id, conversation in conversations_data.items():
-        create_time = conversation.get('create_time', 0)
-        all_conversations.append({
-            'id': conv_id,
-            'data': conversation,
-            'create_time': create_time
-        })
-
-    all_conversations.sort(key=lambda x: x['create_time'], reverse=True)
-
-    if append:
-        new_conversations = [c for c in all_conversations if c['id'] not in existing_ids]
-        if log_callback:
-            log_callback(f"Found {len(new_conversations)} new conversations to add\n")
-
-        if not new_conversations:
-            if log_callback:
-                log_callback("No new conversations to add to archive\n")
-            return 0
-
-        with open(archive_path, 'a', encoding='utf-8') as f:
-            for conv in new_conversations:
-                entry = create_archive_entry(conv['data'], conv['id'])
-                f.write(entry)
-                f.write('\n')
-
-        if log_callback:
-            log_callback(f"Appended {len(new_conversations)} conversations to {archive_path}\n")
-        return len(new_conversations)
-    else:
-        with open(archive_path, 'w', encoding='utf-8') as f:
-            for conv in all_conversations:
-                entry = create_archive_entry(conv['data'], conv['id'])
-                f.write(entry)
-                f.write('\n')
-
-        if log_callback:
-            log_callback(f"Wrote {len(all_conversations)} conversations to {archive_path}\n")
-        return len(all_conversations)
-
-
-def write_individual_files(conversations_data, output_dir, log_callback=None):
-    """Write each conversation to individual text file"""
-    os.makedirs(output_dir, exist_ok=True)
-
-    count = 0
-    for conversation_id, conversation in conversations_data.items():
-        title = conversation.get('title', 'Untitled Conversation')
-        safe_title = sanitize_filename(title)
-
-        # Get timestamps
-        create_time = conversation.get('create_time', 0)
-        update_time = conversation.get('update_time', 0)
-
-        # Format dates
-        if create_time:
-            create_date = datetime.fromtimestamp(create_time).strftime('%Y-%m-%d')
-        else:
-            create_date = 'unknown'
+from extractor import (ArchiveSink, ConversationFilter, IndividualFilesSink, PipelineCancelled,
+                       RunStats, export_size, iter_export, parse_time_arg, render_key_for,
+                       run_pipeline)
 
-        if update_time:
-            update_date = datetime.fromtimestamp(update_time).strftime('%Y-%m-%d')
-        else:
-            update_date = 'unknown'
 
-        # Create filename with date stamps: create_date__update_date_title_id.txt
-        filename = f"{create_date}__{update_date}_{safe_title}_{conversation_id[:8]}.txt"
-        filepath = os.path.join(output_dir, filename)
+# How often the Tk main loop drains messages from the extraction thread
+POLL_INTERVAL_MS = 100
 
-        content = extract_conversation_text(conversation)
+# Minimum seconds between progress updates sent by the extraction thread
+PROGRESS_INTERVAL = 0.1
 
-        try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            count += 1
-        except Exception as e:
-            if log_callback:
-                log_callback(f"Error writing {filename}: {e}\n")
 
-    if log_callback:
-        log_callback(f"Extracted {count} conversations to {output_dir}/\n")
-    return count
+def format_duration(seconds):
+    """Format seconds as H:MM:SS or M:SS"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
 
 
 class ExtractorGUI:
@@ -222,8 +49,26 @@ class ExtractorGUI:
         self.output_dir = tk.StringVar(value="chatgpt_conversations")
         self.archive_file = tk.StringVar(value="chatgpt_archive.txt")
         self.no_append = tk.BooleanVar(value=False)
+        self.update_archive = tk.BooleanVar(value=False)
+        self.progress_text = tk.StringVar(value="")
+
+        # Filters; empty fields don't filter
+        self.since = tk.StringVar()
+        self.until = tk.StringVar()
+        self.time_field = tk.StringVar(value="create")
+        self.title_filter = tk.StringVar()
+        self.model_filter = tk.StringVar()
+        self.min_messages = tk.StringVar()
+
+        # The extraction thread never touches widgets; it posts messages
+        # here and poll_messages() applies them on the Tk main loop
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.phase = None
+        self.phase_started = 0.0
 
         self.setup_ui()
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
 
     def setup_ui(self):
         # Main container with padding
@@ -294,15 +139,58 @@ class ExtractorGUI:
                                            variable=self.no_append)
         self.append_check.grid(row=row, column=1, sticky=tk.W, pady=5)
 
+        row += 1
+        self.update_check = ttk.Checkbutton(main_frame,
+                                           text="Update conversations that changed since they were archived",
+                                           variable=self.update_archive)
+        self.update_check.grid(row=row, column=1, sticky=tk.W, pady=5)
+
+        # Filters
+        row += 1
+        ttk.Label(main_frame, text="Filters:").grid(row=row, column=0, sticky=tk.NW, pady=5)
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.grid(row=row, column=1, columnspan=2, sticky=tk.W, pady=5, padx=5)
+
+        ttk.Label(filter_frame, text="Since:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(filter_frame, textvariable=self.since, width=12).grid(row=0, column=1, padx=(2, 8))
+        ttk.Label(filter_frame, text="Until:").grid(row=0, column=2, sticky=tk.W)
+        ttk.Entry(filter_frame, textvariable=self.until, width=12).grid(row=0, column=3, padx=(2, 8))
+        ttk.Combobox(filter_frame, textvariable=self.time_field, values=["create", "update"],
+                     state='readonly', width=7).grid(row=0, column=4)
+
+        ttk.Label(filter_frame, text="Title:").grid(row=1, column=0, sticky=tk.W, pady=(4, 0))
+        ttk.Entry(filter_frame, textvariable=self.title_filter, width=12).grid(
+            row=1, column=1, padx=(2, 8), pady=(4, 0))
+        ttk.Label(filter_frame, text="Model:").grid(row=1, column=2, sticky=tk.W, pady=(4, 0))
+        ttk.Entry(filter_frame, textvariable=self.model_filter, width=12).grid(
+            row=1, column=3, padx=(2, 8), pady=(4, 0))
+        ttk.Label(filter_frame, text="Min messages:").grid(row=1, column=4, sticky=tk.W, pady=(4, 0))
+        ttk.Entry(filter_frame, textvariable=self.min_messages, width=5).grid(
+            row=1, column=5, padx=2, pady=(4, 0))
+
         # Extract button
         row += 1
         ttk.Separator(main_frame, orient='horizontal').grid(
             row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
 
         row += 1
-        self.extract_button = ttk.Button(main_frame, text="Extract Conversations",
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=row, column=0, columnspan=3, pady=10)
+        self.extract_button = ttk.Button(button_frame, text="Extract Conversations",
                                         command=self.start_extraction)
-        self.extract_button.grid(row=row, column=0, columnspan=3, pady=10)
+        self.extract_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", state='disabled',
+                                       command=self.cancel_extraction)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        # Progress bar with throughput and ETA
+        row += 1
+        self.progress_bar = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 2))
+
+        row += 1
+        ttk.Label(main_frame, textvariable=self.progress_text).grid(
+            row=row, column=0, columnspan=3, sticky=tk.W)
 
         # Progress/log section
         row += 1
@@ -338,16 +226,19 @@ class ExtractorGUI:
             self.archive_entry.config(state='normal')
             self.archive_button.config(state='normal')
             self.append_check.config(state='normal')
+            self.update_check.config(state='normal')
         else:
             self.archive_label.config(state='disabled')
             self.archive_entry.config(state='disabled')
             self.archive_button.config(state='disabled')
             self.append_check.config(state='disabled')
+            self.update_check.config(state='disabled')
 
     def browse_input(self):
         filename = filedialog.askopenfilename(
-            title="Select conversations.json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            title="Select conversations.json or the export ZIP",
+            filetypes=[("ChatGPT exports", "*.json *.zip"), ("JSON files", "*.json"),
+                       ("ZIP files", "*.zip"), ("All files", "*.*")]
         )
         if filename:
             self.input_file.set(filename)
@@ -361,18 +252,73 @@ class ExtractorGUI:
         filename = filedialog.asksaveasfilename(
             title="Archive File",
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[("Text files", "*.txt"), ("Compressed archives", "*.gz *.xz *.zst"),
+                       ("All files", "*.*")]
         )
         if filename:
             self.archive_file.set(filename)
 
     def log(self, message):
-        """Add message to log window"""
+        """Queue a message for the log window; safe to call from any thread"""
+        self.messages.put(('log', message))
+
+    def poll_messages(self):
+        """Apply queued messages from the extraction thread, batching log text into one insert"""
+        text = []
+        progress = None
+        try:
+            while True:
+                message = self.messages.get_nowait()
+                kind = message[0]
+                if kind == 'log':
+                    text.append(message[1])
+                elif kind == 'progress':
+                    progress = message[1:]
+                else:
+                    if text:
+                        self.append_log(''.join(text))
+                        text = []
+                    if progress:
+                        self.show_progress(*progress)
+                        progress = None
+                    self.finish_extraction(*message[1:])
+        except queue.Empty:
+            pass
+        if text:
+            self.append_log(''.join(text))
+        if progress:
+            self.show_progress(*progress)
+        self.root.after(POLL_INTERVAL_MS, self.poll_messages)
+
+    def append_log(self, text):
+        """Add text to the log window (main thread only)"""
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, message)
+        self.log_text.insert(tk.END, text)
         self.log_text.see(tk.END)
         self.log_text.config(state='disabled')
-        self.root.update_idletasks()
+
+    def show_progress(self, phase, done, total):
+        """Update the progress bar and its throughput/ETA line (main thread only)"""
+        now = time.perf_counter()
+        if phase != self.phase:
+            self.phase = phase
+            self.phase_started = now
+            if phase != 'parse':
+                # Outputs are being finished; stopping now would leave them half written
+                self.cancel_button.config(state='disabled')
+        elapsed = now - self.phase_started
+        rate = done / elapsed if elapsed > 0 else 0.0
+
+        if phase == 'parse':
+            label = f"Reading export: {done / 1e6:.1f} / {total / 1e6:.1f} MB"
+            speed = f"{rate / 1e6:.1f} MB/s"
+        else:
+            label = f"Writing {phase.split(' ', 1)[-1]}: {done:,} / {total:,} conversations"
+            speed = f"{rate:,.0f} conversations/s"
+        eta = f", ETA {format_duration((total - done) / rate)}" if rate and total else ""
+
+        self.progress_bar['value'] = 100.0 * done / total if total else 0
+        self.progress_text.set(f"{label} ({speed}{eta})")
 
     def clear_log(self):
         """Clear the log window"""
@@ -380,6 +326,29 @@ class ExtractorGUI:
         self.log_text.delete(1.0, tk.END)
         self.log_text.config(state='disabled')
 
+    def build_filter(self):
+        """ConversationFilter from the filter fields, or None if they are all empty
+
+        Raises ValueError with a message for the user on bad input.
+        """
+        since, until = self.since.get().strip(), self.until.get().strip()
+        models = [m.strip() for m in self.model_filter.get().split(',') if m.strip()]
+        min_messages = self.min_messages.get().strip()
+        if min_messages and not min_messages.isdigit():
+            raise ValueError("Min messages must be a whole number")
+        try:
+            conversation_filter = ConversationFilter(
+                since=parse_time_arg(since) if since else None,
+                until=parse_time_arg(until, end=True) if until else None,
+                time_field=self.time_field.get(),
+                title=self.title_filter.get().strip() or None,
+                models=models or None,
+                min_messages=int(min_messages) if min_messages else None,
+            )
+        except re.error as e:
+            raise ValueError(f"Invalid title pattern: {e}")
+        return conversation_filter if conversation_filter else None
+
     def start_extraction(self):
         """Start extraction in a separate thread"""
         # Validate input
@@ -391,71 +360,125 @@ class ExtractorGUI:
             messagebox.showerror("Error", f"File not found: {self.input_file.get()}")
             return
 
+        try:
+            conversation_filter = self.build_filter()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
         # Disable extract button during processing
         self.extract_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.cancel_event.clear()
+        self.phase = None
+        self.progress_bar['value'] = 0
+        self.progress_text.set("")
         self.clear_log()
 
         # Run extraction in thread to keep UI responsive
-        thread = threading.Thread(target=self.extract, daemon=True)
+        # Tk variables are read here, on the main thread, and passed along
+        settings = (self.input_file.get(), self.output_mode.get(), self.output_dir.get(),
+                    self.archive_file.get(), self.no_append.get(), self.update_archive.get(),
+                    conversation_filter)
+        thread = threading.Thread(target=self.extract, args=settings, daemon=True)
         thread.start()
 
-    def extract(self):
-        """Perform the extraction"""
+    def cancel_extraction(self):
+        """Ask the pipeline to stop before the next conversation"""
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        self.log("Cancelling...\n")
+
+    def finish_extraction(self, kind, message):
+        """Report the outcome of a run and re-enable the controls (main thread only)"""
+        self.extract_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
+        if kind == 'success':
+            self.progress_bar['value'] = 100
+            messagebox.showinfo("Success", message)
+        elif kind == 'cancelled':
+            self.progress_text.set("Cancelled")
+        else:
+            messagebox.showerror("Error", message)
+
+    def extract(self, input_file, mode, output_dir, archive_file, no_append, update_archive,
+                conversation_filter=None):
+        """Perform the extraction (runs on a worker thread)"""
         try:
-            self.log(f"Loading {self.input_file.get()}...\n")
-
-            # Load JSON
-            with open(self.input_file.get(), 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Handle both list and dict formats
-            if isinstance(data, list):
-                conversations = {}
-                for conv in data:
-                    title = conv.get('title', 'untitled')
-                    create_time = conv.get('create_time', 0)
-                    id_string = f"{create_time}_{title}"
-                    conv_id = hashlib.sha256(id_string.encode()).hexdigest()[:16]
-                    conversations[conv_id] = conv
-            else:
-                conversations = data
-
-            if not conversations:
+            self.log(f"Streaming {input_file}...\n")
+
+            # Stream the export one conversation at a time instead of
+            # loading the whole file into memory
+            if next(iter_export(input_file), None) is None:
                 self.log("ERROR: No conversations found in file\n")
-                messagebox.showerror("Error", "No conversations found in input file")
+                self.messages.put(('done', 'error', "No conversations found in input file"))
                 return
+            total_bytes = export_size(input_file)
 
-            self.log(f"Loaded {len(conversations)} conversations\n\n")
+            def log_line(message):
+                self.log(message + "\n")
 
-            mode = self.output_mode.get()
-
-            # Extract based on mode
+            # Build outputs based on mode; each conversation is rendered once
+            # and written to every selected output in a single pass
+            sinks = []
             if mode in ["individual", "both"]:
-                self.log("--- Individual Files Mode ---\n")
-                count = write_individual_files(conversations, self.output_dir.get(), self.log)
-                self.log("\n")
-
+                sinks.append(IndividualFilesSink(output_dir, render_key=render_key_for()))
             if mode in ["archive", "both"]:
-                self.log("--- Archive Mode ---\n")
-                count = write_archive(conversations, self.archive_file.get(),
-                                    not self.no_append.get(), self.log)
-                self.log("\n")
+                # A fresh archive has nothing to update
+                sinks.append(ArchiveSink(archive_file, not no_append,
+                                         update=update_archive and not no_append))
+
+            # Progress is throttled here so a fast run doesn't flood the queue
+            position = [0]
+            last_sent = [0.0]
+
+            def send_progress(phase, done, total, force=False):
+                now = time.perf_counter()
+                if force or now - last_sent[0] >= PROGRESS_INTERVAL:
+                    last_sent[0] = now
+                    self.messages.put(('progress', phase, done, total))
+
+            def tracked(items):
+                for item in items:
+                    position[0] = item[2].end
+                    yield item
+
+            def progress(phase, done, total):
+                if phase == 'read':
+                    send_progress('parse', position[0], total_bytes)
+                else:
+                    send_progress(phase, done, total, force=done == total)
+
+            stats = RunStats()
+            conversations = iter_export(input_file, with_source=True,
+                                        filter_func=conversation_filter)
+            count = run_pipeline(tracked(conversations), sinks,
+                                 log=log_line, stats=stats, progress=progress,
+                                 cancel=self.cancel_event)
+            self.log(f"Processed {count} conversations\n")
+            if conversation_filter:
+                self.log(f"Filtered out {conversation_filter.rejected} conversations\n")
+            self.log("\n")
+            for line in stats.report():
+                log_line(line)
+            self.log("\n")
 
             self.log("=" * 60 + "\n")
             self.log("EXTRACTION COMPLETE!\n")
             self.log("=" * 60 + "\n")
 
-            messagebox.showinfo("Success", "Extraction completed successfully!")
+            self.messages.put(('done', 'success', "Extraction completed successfully!"))
 
+        except PipelineCancelled as e:
+            self.log(f"\n{e}. Individual files written so far are kept; "
+                     f"the archive was not changed.\n")
+            self.messages.put(('done', 'cancelled', str(e)))
         except json.JSONDecodeError:
             self.log(f"\nERROR: Invalid JSON file\n")
-            messagebox.showerror("Error", "The selected file is not valid JSON")
+            self.messages.put(('done', 'error', "The selected file is not valid JSON"))
         except Exception as e:
             self.log(f"\nERROR: {str(e)}\n")
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
-        finally:
-            # Re-enable extract button
-            self.root.after(0, lambda: self.extract_button.config(state='normal'))
+            self.messages.put(('done', 'error', f"An error occurred:\n{str(e)}"))
 
 
 def main():
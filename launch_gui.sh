@@ -8,6 +8,6 @@ elif command -v python &> /dev/null; then
     python extractor_gui.py
 else
     echo "Error: Python not found"
-    echo "Please install Python 3.6 or higher"
+    echo "Please install Python 3.7 or higher"
     exit 1
 fi
@@ -0,0 +1,50 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_index import ArchiveIndex, ArchiveWriter, seal_entry  # noqa: E402
+from benchmark import generate_conversation  # noqa: E402
+from extractor import create_archive_entry  # noqa: E402
+
+
+def make_conversations(count, start=0):
+    """{id: conversation} of small synthetic conversations numbered from start"""
+    rng = random.Random(start)
+    conversations = (generate_conversation(rng, index, depth=4, message_size=40)
+                     for index in range(start, start + count))
+    return {conversation['id']: conversation for conversation in conversations}
+
+
+@pytest.fixture
+def write_export(tmp_path):
+    """Write {id: conversation} as a dict-format export and return its path"""
+    def write(conversations, name='conversations.json'):
+        path = str(tmp_path / name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(conversations, f)
+        return path
+    return write
+
+
+def sealed_entry(number):
+    """Archive bytes of a small numbered entry with ID id-<number>"""
+    conversation = {'title': f"Conversation {number}", 'create_time': 1700000000 + number}
+    body = create_archive_entry(conversation, f"id-{number}", content=f"USER:\nmessage {number}\n")
+    return seal_entry(body.encode('utf-8'))
+
+
+def append_entries(path, numbers, mode='ab'):
+    """Append sealed_entry(number) for each number to the archive at path, two per frame"""
+    index = ArchiveIndex.load(path, log=lambda message: None)
+    index.drop_incomplete()
+    with ArchiveWriter(index, mode, frame_entries=2) as writer:
+        for number in numbers:
+            writer.write(f"id-{number}", sealed_entry(number))
+    index.save()
+    return index
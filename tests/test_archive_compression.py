@@ -0,0 +1,52 @@
+import gzip
+import lzma
+
+import pytest
+
+from archive_index import ArchiveIndex
+from conftest import make_conversations
+from extractor import main
+
+
+@pytest.mark.parametrize('extension, decompress', [('.gz', gzip.decompress),
+                                                   ('.xz', lzma.decompress)])
+def test_compressed_archive_matches_plain(tmp_path, write_export, extension, decompress):
+    export = write_export(make_conversations(9))
+    plain = str(tmp_path / 'archive.txt')
+    packed = plain + extension
+    assert main([export, '-a', plain]) == 0
+    assert main([export, '-a', packed, '--frame-size', '4']) == 0
+
+    with open(plain, 'rb') as f, open(packed, 'rb') as g:
+        assert decompress(g.read()) == f.read()
+    index = ArchiveIndex.load(packed)
+    assert len(index.frames) == 3
+    plain_index = ArchiveIndex.load(plain)
+    for conversation_id in plain_index.ids():
+        assert index.read_entry(conversation_id) == plain_index.read_entry(conversation_id)
+
+
+def test_append_adds_frames(tmp_path, write_export):
+    packed = str(tmp_path / 'archive.txt.gz')
+    assert main([write_export(make_conversations(4)), '-a', packed, '--frame-size', '4']) == 0
+    first = ArchiveIndex.load(packed).frames
+    everything = dict(make_conversations(4), **make_conversations(2, start=4))
+    assert main([write_export(everything), '-a', packed, '--frame-size', '4']) == 0
+
+    index = ArchiveIndex.load(packed)
+    assert index.frames[:1] == first and len(index.frames) == 2
+    assert index.ids() == set(everything)
+
+
+def test_read_entry_decompresses_one_frame(tmp_path, write_export, monkeypatch):
+    packed = str(tmp_path / 'archive.txt.gz')
+    conversations = make_conversations(8)
+    assert main([write_export(conversations), '-a', packed, '--frame-size', '2']) == 0
+    index = ArchiveIndex.load(packed)
+
+    calls = []
+    decompressor = index.codec.decompressor
+    monkeypatch.setattr(index, 'codec', index.codec._replace(
+        decompressor=lambda: calls.append(1) or decompressor()))
+    assert index.read_entry(next(iter(conversations)))
+    assert len(calls) == 1
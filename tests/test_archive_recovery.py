@@ -0,0 +1,148 @@
+import gzip
+import io
+import os
+
+import pytest
+
+import archive_index
+from archive_index import ArchiveIndex, entry_body, list_shards
+from conftest import append_entries, make_conversations, sealed_entry
+from extractor import fetch_from_archive, main
+
+
+def _quiet(message):
+    pass
+
+
+def _tear(path):
+    """Leave half a frame at the end of a compressed archive, as a killed append would"""
+    with open(path, 'rb') as f:
+        head = f.read(200)
+    with open(path, 'ab') as f:
+        f.write(head)
+
+
+@pytest.fixture(params=['archive.txt', 'archive.txt.gz'])
+def archive_path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def test_killed_append_is_rebuilt_and_rewritten(archive_path, tmp_path):
+    append_entries(archive_path, [1, 2, 3])
+    complete = os.path.getsize(archive_path)
+
+    # A run killed partway through appending: half an entry or frame at the end
+    append_entries(archive_path, [4])
+    os.truncate(archive_path, complete + (os.path.getsize(archive_path) - complete) // 2)
+
+    index = ArchiveIndex.load(archive_path, log=_quiet)
+    assert index.ids() == {'id-1', 'id-2', 'id-3'}
+    assert index.complete_size == complete
+    assert index.drop_incomplete() > 0
+    assert os.path.getsize(archive_path) == complete
+
+    append_entries(archive_path, [4, 5])
+    reference = str(tmp_path / ('reference' + os.path.basename(archive_path)))
+    append_entries(reference, [1, 2, 3])
+    append_entries(reference, [4, 5])
+    with open(archive_path, 'rb') as f, open(reference, 'rb') as g:
+        assert f.read() == g.read()
+
+    os.remove(archive_path + '.idx')
+    rebuilt = ArchiveIndex.load(archive_path, log=_quiet)
+    assert rebuilt.ids() == {f"id-{number}" for number in range(1, 6)}
+    for number in range(1, 6):
+        assert rebuilt.read_entry(f"id-{number}") == sealed_entry(number)
+
+
+def test_saved_index_remembers_torn_tail(archive_path):
+    append_entries(archive_path, [1, 2])
+    complete = os.path.getsize(archive_path)
+    with open(archive_path, 'ab') as f:
+        f.write(sealed_entry(3)[:40])
+
+    # A reader rebuilds and saves the index; the next writer still drops the tail
+    ArchiveIndex.load(archive_path, log=_quiet)
+    index = ArchiveIndex.load(archive_path, log=_quiet)
+    assert index.complete_size == complete
+    assert index.drop_incomplete() == 40
+    append_entries(archive_path, [3])
+    assert ArchiveIndex.load(archive_path).complete_size == os.path.getsize(archive_path)
+
+
+def test_corrupted_entry_is_left_out_of_rebuild(tmp_path):
+    path = str(tmp_path / 'archive.txt')
+    append_entries(path, [1, 2])
+    with open(path, 'r+b') as f:
+        data = f.read()
+        f.seek(data.index(b'message 2'))
+        f.write(b'MESSAGE 2')
+    os.remove(path + '.idx')
+
+    assert ArchiveIndex.load(path, log=_quiet).ids() == {'id-1'}
+
+
+def test_entry_body_strips_trailer():
+    data = sealed_entry(1)
+    assert entry_body(data).endswith(b'=' * 80 + b'\n')
+    assert b'Checksum' not in entry_body(data)
+
+
+def test_fetch_leaves_out_trailers(tmp_path):
+    path = str(tmp_path / 'archive.txt')
+    append_entries(path, [1, 2])
+    out = io.BytesIO()
+    assert fetch_from_archive(path, ['id-2', 'id-1'], out, log=_quiet) == 0
+    assert out.getvalue() == (entry_body(sealed_entry(2)) + b'\n'
+                              + entry_body(sealed_entry(1)) + b'\n')
+
+
+def test_append_after_get_on_torn_archive(tmp_path, write_export):
+    first = make_conversations(10)
+    everything = dict(first, **make_conversations(20, start=10))
+    path = str(tmp_path / 'archive.txt.gz')
+    assert main([write_export(first), '-a', path, '--frame-size', '4']) == 0
+    _tear(path)
+    os.remove(path + '.idx')
+
+    # get rebuilds and saves the index before the next append runs
+    assert main(['get', next(iter(first)), '--archive', path]) == 0
+    assert main([write_export(everything, 'all.json'), '-a', path, '--frame-size', '4']) == 0
+
+    os.remove(path + '.idx')
+    assert ArchiveIndex.load(path, log=_quiet).ids() == set(everything)
+    with gzip.open(path, 'rb') as f:
+        assert f.read().count(b'\nCONVERSATION: ') == len(everything)
+
+
+def test_sharded_size_archive_recovers_torn_part(tmp_path, write_export):
+    first = make_conversations(10)
+    everything = dict(first, **make_conversations(20, start=10))
+    path = str(tmp_path / 'archive.txt.gz')
+    assert main([write_export(first), '-a', path, '--shard', '1', '--frame-size', '4']) == 0
+    [part] = list_shards(str(tmp_path / 'archive'))
+    _tear(part)
+    os.remove(part + '.idx')
+
+    assert main([write_export(everything, 'all.json'), '-a', path, '--shard', '1',
+                 '--frame-size', '4']) == 0
+
+    os.remove(part + '.idx')
+    assert ArchiveIndex.load(part, log=_quiet).ids() == set(everything)
+
+
+def test_killed_fresh_write_keeps_previous_archive(tmp_path, write_export, monkeypatch):
+    path = str(tmp_path / 'archive.txt')
+    assert main([write_export(make_conversations(5)), '-a', path]) == 0
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    def killed(self, *args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(archive_index.ArchiveWriter, 'write', killed)
+    with pytest.raises(KeyboardInterrupt):
+        main([write_export(make_conversations(5, start=5)), '-a', path, '--no-append'])
+
+    with open(path, 'rb') as f:
+        assert f.read() == before
+    assert sorted(os.listdir(tmp_path)) == ['archive.txt', 'archive.txt.idx', 'conversations.json']
@@ -0,0 +1,78 @@
+import json
+import os
+
+from archive_index import ArchiveIndex
+from conftest import append_entries, make_conversations, sealed_entry
+from extractor import ConversationRecord, iter_export, load_manifest, main, render_key_for
+
+
+def _outputs(tmp_path):
+    return ['-a', str(tmp_path / 'archive.txt'), '--update', '-i', '-o', str(tmp_path / 'out'),
+            '--sqlite', str(tmp_path / 'conversations.db')]
+
+
+def test_digest_ignores_export_formatting(write_export):
+    conversations = make_conversations(3)
+    compact = write_export(conversations)
+    digests = {cid: source.digest for cid, conversation, source in iter_export(compact, True)}
+
+    with open(compact, 'w', encoding='utf-8') as f:
+        json.dump(conversations, f, indent=2, sort_keys=True)
+    assert {cid: source.digest for cid, conversation, source in iter_export(compact, True)} == digests
+    assert {cid: ConversationRecord(cid, conversation).digest
+            for cid, conversation in conversations.items()} == digests
+
+
+def test_reformatted_export_changes_nothing(tmp_path, write_export, capsys):
+    conversations = make_conversations(5)
+    assert main([write_export(conversations)] + _outputs(tmp_path)) == 0
+    archive_size = os.path.getsize(tmp_path / 'archive.txt')
+    capsys.readouterr()
+
+    path = str(tmp_path / 'reformatted.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(conversations, f, indent=1, sort_keys=True)
+    assert main([path] + _outputs(tmp_path)) == 0
+
+    output = capsys.readouterr().out
+    assert 'Found 0 new and 0 changed conversations to add' in output
+    assert '0 new, 0 changed (0 renamed), 5 unchanged' in output
+    assert '(0 new, 0 updated)' in output
+    assert os.path.getsize(tmp_path / 'archive.txt') == archive_size
+
+
+def test_changed_conversation_is_appended_and_compacted(tmp_path, write_export, capsys):
+    conversations = make_conversations(5)
+    assert main([write_export(conversations)] + _outputs(tmp_path)) == 0
+    changed = next(iter(conversations))
+    conversations[changed]['title'] = 'Renamed conversation'
+    conversations[changed]['update_time'] += 60
+    assert main([write_export(conversations)] + _outputs(tmp_path)) == 0
+    assert 'Found 0 new and 1 changed conversations to add' in capsys.readouterr().out
+
+    archive_path = str(tmp_path / 'archive.txt')
+    index = ArchiveIndex.load(archive_path)
+    assert len(index) == 5 and index.dead_bytes() > 0
+    assert b'Renamed conversation' in index.read_entry(changed)
+    manifest = load_manifest(str(tmp_path / 'out'), render_key_for(False))
+    assert manifest[changed]['title'] == 'Renamed conversation'
+
+    assert main(['compact', archive_path]) == 0
+    compacted = ArchiveIndex.load(archive_path)
+    assert compacted.dead_bytes() == 0
+    assert b'Renamed conversation' in compacted.read_entry(changed)
+
+
+def test_compact_drops_tombstones(tmp_path):
+    for name in ('archive.txt', 'archive.txt.gz'):
+        path = str(tmp_path / name)
+        append_entries(path, [1, 2, 3])
+        index = append_entries(path, [2])
+        assert index.dead_bytes() == len(sealed_entry(2))
+
+        index.compact()
+        assert index.dead_bytes() == 0
+        reloaded = ArchiveIndex.load(path)
+        assert [cid for cid, data in reloaded.iter_entries(reloaded.ids())] == ['id-1', 'id-3', 'id-2']
+        for number in (1, 2, 3):
+            assert reloaded.read_entry(f"id-{number}") == sealed_entry(number)
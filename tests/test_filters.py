@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from conftest import make_conversations
+from export_cache import ExportCache
+from extractor import ConversationFilter, iter_export, iter_export_cached, parse_time_arg
+
+
+def _conversation(title='Chat', create_time=1000.0, model='gpt-4o', messages=4):
+    mapping = {}
+    parent = None
+    for number in range(messages):
+        node_id = f"n{number}"
+        mapping[node_id] = {'id': node_id, 'parent': parent, 'children': [],
+                            'message': {'author': {'role': 'user'},
+                                        'content': {'content_type': 'text', 'parts': ['hi']}}}
+        if parent:
+            mapping[parent]['children'].append(node_id)
+        parent = node_id
+    return {'title': title, 'create_time': create_time, 'update_time': create_time + 50,
+            'default_model_slug': model, 'mapping': mapping, 'current_node': parent}
+
+
+def test_time_range_is_inclusive_then_exclusive():
+    check = ConversationFilter(since=1000, until=2000)
+    assert check(_conversation(create_time=1000))
+    assert not check(_conversation(create_time=2000))
+    assert not check(_conversation(create_time=999))
+    assert not check({'title': 'undated'})
+    assert (check.kept, check.rejected) == (1, 3)
+
+
+def test_time_field_update():
+    check = ConversationFilter(since=1040, time_field='update')
+    assert check(_conversation(create_time=1000))
+    assert not ConversationFilter(since=1040)(_conversation(create_time=1000))
+
+
+def test_title_model_and_length():
+    assert ConversationFilter(title='^sql')(_conversation(title='SQL tuning'))
+    assert not ConversationFilter(title='^sql')(_conversation(title='About SQL'))
+    assert ConversationFilter(models=['o1', 'gpt-4o'])(_conversation())
+    assert not ConversationFilter(models=['o1'])(_conversation())
+    assert ConversationFilter(min_messages=4)(_conversation(messages=4))
+    assert not ConversationFilter(min_messages=5)(_conversation(messages=4))
+
+
+def test_empty_filter_is_falsy():
+    assert not ConversationFilter()
+    assert ConversationFilter(title='x')
+
+
+def test_until_date_includes_the_whole_day():
+    end = parse_time_arg('2024-05-01', end=True)
+    assert end == datetime(2024, 5, 2).timestamp()
+
+
+def test_cached_metadata_filters_like_the_conversation(write_export):
+    conversations = make_conversations(10)
+    export = write_export(conversations)
+    middle = sorted(conversation['create_time'] for conversation in conversations.values())[5]
+
+    streamed = [cid for cid, conversation in iter_export(export, filter_func=ConversationFilter(
+        since=middle, min_messages=2))]
+    list(iter_export_cached(export, log=lambda message: None))
+    assert ExportCache.load(export) is not None
+    cached = [cid for cid, stub, source, loader in iter_export_cached(
+        export, ConversationFilter(since=middle, min_messages=2))]
+    assert streamed == cached and len(cached) == 5
@@ -0,0 +1,54 @@
+import os
+
+from conftest import make_conversations
+from extractor import load_manifest, main, render_key_for
+
+
+def _run(export, output_dir, capsys, *options):
+    assert main([export, '-i', '-o', output_dir] + list(options)) == 0
+    return capsys.readouterr().out
+
+
+def test_unchanged_conversations_are_skipped(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    export = write_export(make_conversations(4))
+    assert '4 new, 0 changed (0 renamed), 0 unchanged' in _run(export, output_dir, capsys)
+    assert '0 new, 0 changed (0 renamed), 4 unchanged' in _run(export, output_dir, capsys)
+
+
+def test_renamed_conversation_replaces_its_file(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    conversations = make_conversations(4)
+    _run(write_export(conversations), output_dir, capsys)
+    changed = next(iter(conversations))
+    old_file = load_manifest(output_dir, render_key_for())[changed]['file']
+
+    conversations[changed]['title'] = 'A new title'
+    conversations[changed]['update_time'] += 60
+    output = _run(write_export(conversations), output_dir, capsys)
+
+    assert '0 new, 1 changed (1 renamed), 3 unchanged' in output
+    new_file = load_manifest(output_dir, render_key_for())[changed]['file']
+    assert 'A_new_title' in new_file
+    assert not os.path.exists(os.path.join(output_dir, old_file))
+    assert os.path.exists(os.path.join(output_dir, new_file))
+
+
+def test_deleted_file_is_written_again(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    conversations = make_conversations(3)
+    export = write_export(conversations)
+    _run(export, output_dir, capsys)
+    manifest = load_manifest(output_dir, render_key_for())
+    os.remove(os.path.join(output_dir, manifest[next(iter(conversations))]['file']))
+
+    assert '0 new, 1 changed (0 renamed), 2 unchanged' in _run(export, output_dir, capsys)
+    assert all(os.path.exists(os.path.join(output_dir, entry['file']))
+               for entry in manifest.values())
+
+
+def test_render_settings_invalidate_the_manifest(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    export = write_export(make_conversations(3))
+    _run(export, output_dir, capsys)
+    assert '3 new' in _run(export, output_dir, capsys, '--all-branches')
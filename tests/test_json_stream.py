@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+from conftest import make_conversations
+from extractor import iter_json_items
+
+
+DOCUMENTS = [
+    '[1.5, 2e10, -3.25E-2, 7, true, null, "x", {"a": 1.5}, [0.125, -1]]',
+    '{"a": 12.75, "b": -0.5e-3, "c": {"d": [1, 2]}, "e": "café \\u00e9\\n"}',
+    '\ufeff[ {"title": "ünïcode \U0001F600", "n": 1.0e+5} , 42 ]',
+    '[]',
+    '{ }',
+]
+
+
+def _expected(document):
+    value = json.loads(document.lstrip('\ufeff'))
+    return list(value.items()) if isinstance(value, dict) else [(None, item) for item in value]
+
+
+def _assert_items_match(document, chunk_size):
+    data = document.encode('utf-8')
+    items = list(iter_json_items(io.BytesIO(data), chunk_size))
+
+    assert [(key, value) for key, value, start, end, raw in items] == _expected(document)
+    for key, value, start, end, raw in items:
+        assert raw == data[start:end]
+        assert json.loads(raw) == value
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64])
+def test_items_match_json_loads(document, chunk_size):
+    _assert_items_match(document, chunk_size)
+
+
+def test_rejects_scalar_document():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_items(io.BytesIO(b'1.5'), 1))
+
+
+def test_reports_missing_delimiter():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_items(io.BytesIO(b'[1 2]'), 1))
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, 1000])
+def test_conversations_split_across_chunks(chunk_size):
+    document = json.dumps(make_conversations(3), ensure_ascii=False, indent=1)
+    _assert_items_match(document, chunk_size)
+
+
+class _CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_syntax_error_does_not_buffer_the_rest():
+    filler = json.dumps(list(make_conversations(50).values()))[1:-1]
+    stream = _CountingStream(b'[{"title": "bad" "x": 1}, ' + filler.encode('utf-8') + b']')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_items(stream, 4096))
+    assert stream.bytes_read <= 2 * 4096
@@ -0,0 +1,81 @@
+import json
+import os
+
+from conftest import make_conversations
+from extractor import JSONLSink, chunk_messages, estimate_tokens, run_pipeline
+
+
+def _quiet(message):
+    pass
+
+
+def _messages(*texts):
+    return [{'role': 'user', 'text': text} for text in texts]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('abcde') == 2
+    assert estimate_tokens('日本語') == 3
+
+
+def test_chunks_stay_within_budget_and_overlap():
+    messages = _messages(*(f"message {number} " * 5 for number in range(20)))
+    windows = list(chunk_messages(messages, max_tokens=40, overlap=15))
+
+    assert len(windows) > 1
+    for window, tokens in windows:
+        assert tokens <= 40
+        assert tokens == sum(estimate_tokens(message['text']) for message in window)
+    for (before, _), (after, _) in zip(windows, windows[1:]):
+        assert after[0] in before
+    seen = [message for window, _ in windows for message in window]
+    assert all(message in seen for message in messages)
+
+
+def test_chunks_without_overlap_partition_messages():
+    messages = _messages(*(f"message {number} " * 5 for number in range(20)))
+    windows = list(chunk_messages(messages, max_tokens=40))
+    assert [message for window, _ in windows for message in window] == messages
+
+
+def test_long_message_is_cut_into_numbered_parts():
+    text = 'word ' * 200
+    windows = list(chunk_messages(_messages(text), max_tokens=30))
+
+    pieces = [message for window, _ in windows for message in window]
+    assert [piece['part'] for piece in pieces] == list(range(len(pieces)))
+    assert ''.join(piece['text'] for piece in pieces) == text
+    assert all(tokens <= 30 for _, tokens in windows)
+
+
+def test_part_files_rotate(tmp_path):
+    output_dir = str(tmp_path / 'jsonl')
+    conversations = make_conversations(10)
+
+    sink = JSONLSink(output_dir, chunk_tokens=50, part_bytes=2000)
+    run_pipeline(conversations, [sink], log=_quiet)
+
+    names = sorted(os.listdir(output_dir))
+    assert len(names) > 1
+    assert names == [f"part-{number:04d}.jsonl" for number in range(1, len(names) + 1)]
+    records = []
+    for name in names:
+        with open(os.path.join(output_dir, name), encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f)
+    assert len(records) == sink.records
+    assert {record['id'] for record in records} == set(conversations)
+    for record in records:
+        assert record['tokens'] <= 50
+        assert 0 <= record['chunk'] < record['chunks']
+
+
+def test_rerun_removes_leftover_parts(tmp_path):
+    output_dir = str(tmp_path / 'jsonl')
+    conversations = make_conversations(10)
+    run_pipeline(conversations, [JSONLSink(output_dir, part_bytes=2000)], log=_quiet)
+    assert len(os.listdir(output_dir)) > 1
+
+    run_pipeline(conversations, [JSONLSink(output_dir)], log=_quiet)
+    assert os.listdir(output_dir) == ['part-0001.jsonl']
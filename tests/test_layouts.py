@@ -0,0 +1,72 @@
+import hashlib
+import os
+from datetime import datetime
+
+from conftest import make_conversations
+from extractor import (INDEX_FILENAME, UNDATED_NAME, layout_subdir, list_output_files,
+                       load_manifest, main, render_key_for)
+
+
+def _run(export, output_dir, capsys, *options):
+    assert main([export, '-i', '-o', output_dir] + list(options)) == 0
+    return capsys.readouterr().out
+
+
+def _read_index(output_dir):
+    with open(os.path.join(output_dir, INDEX_FILENAME), encoding='utf-8') as f:
+        header, *rows = [line.rstrip('\n').split('\t') for line in f]
+    return header, rows
+
+
+def test_layout_subdir():
+    conversation = {'create_time': datetime(2024, 5, 17, 12).timestamp()}
+    assert layout_subdir('date', 'abc', conversation) == '2024/05'
+    assert layout_subdir('date', 'abc', {'create_time': None}) == UNDATED_NAME
+    assert layout_subdir('hash', 'abc', conversation) == hashlib.sha1(b'abc').hexdigest()[:2]
+    assert layout_subdir('flat', 'abc', conversation) == ''
+
+
+def test_date_layout_writes_dated_dirs_and_index(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    conversations = make_conversations(5)
+    _run(write_export(conversations), output_dir, capsys, '--layout', 'date')
+
+    manifest = load_manifest(output_dir, render_key_for())
+    files = list_output_files(output_dir)
+    for conversation_id, conversation in conversations.items():
+        path = manifest[conversation_id]['file']
+        assert path.rpartition('/')[0] == layout_subdir('date', conversation_id, conversation)
+        assert path in files
+
+    header, rows = _read_index(output_dir)
+    assert header == ['id', 'created', 'title', 'file']
+    assert [row[0] for row in rows] == sorted(
+        conversations, key=lambda cid: conversations[cid]['create_time'], reverse=True)
+    assert all(row[3] == manifest[row[0]]['file'] for row in rows)
+
+
+def test_flat_layout_has_no_index(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    _run(write_export(make_conversations(3)), output_dir, capsys)
+    assert INDEX_FILENAME not in os.listdir(output_dir)
+
+
+def test_layout_switch_moves_files_and_prunes_vacated_dirs(tmp_path, write_export, capsys):
+    output_dir = str(tmp_path / 'out')
+    conversations = make_conversations(5)
+    export = write_export(conversations)
+    _run(export, output_dir, capsys, '--layout', 'date')
+    dated = {path.rpartition('/')[0] for path in list_output_files(output_dir) if '/' in path}
+    own_dir = os.path.join(output_dir, 'notes')
+    os.makedirs(own_dir)
+
+    output = _run(export, output_dir, capsys, '--layout', 'hash')
+
+    assert '0 new, 5 changed (5 renamed), 0 unchanged' in output
+    manifest = load_manifest(output_dir, render_key_for())
+    files = list_output_files(output_dir)
+    assert all(manifest[cid]['file'] in files for cid in conversations)
+    assert not any(os.path.exists(os.path.join(output_dir, subdir)) for subdir in dated)
+    assert os.path.isdir(own_dir)
+    _, rows = _read_index(output_dir)
+    assert {row[3] for row in rows} == {entry['file'] for entry in manifest.values()}
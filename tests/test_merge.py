@@ -0,0 +1,45 @@
+import copy
+
+from archive_index import ArchiveIndex
+from conftest import make_conversations
+from extractor import main
+
+
+def _quiet(message):
+    pass
+
+
+def test_merge_keeps_latest_version_newest_first(tmp_path, write_export):
+    everything = make_conversations(8)
+    ids = list(everything)
+    first = {cid: everything[cid] for cid in ids[:5]}
+    second = copy.deepcopy({cid: everything[cid] for cid in ids[3:]})
+    second[ids[3]]['title'] = 'Newer in the second export'
+    second[ids[3]]['update_time'] += 100
+    second[ids[4]]['title'] = 'Older in the second export'
+    second[ids[4]]['update_time'] -= 100
+    archive_path = str(tmp_path / 'merged.txt')
+
+    assert main(['merge', write_export(first, 'first.json'), write_export(second, 'second.json'),
+                 '-a', archive_path]) == 0
+
+    index = ArchiveIndex.load(archive_path, log=_quiet)
+    assert index.ids() == set(ids)
+    assert b'Newer in the second export' in index.read_entry(ids[3])
+    assert b'Older in the second export' not in index.read_entry(ids[4])
+    by_offset = sorted(ids, key=lambda cid: index.get(cid).offset)
+    assert by_offset == sorted(ids, key=lambda cid: everything[cid]['create_time'], reverse=True)
+
+
+def test_merge_tie_goes_to_later_export(tmp_path, write_export):
+    conversations = make_conversations(2)
+    renamed = copy.deepcopy(conversations)
+    for conversation in renamed.values():
+        conversation['title'] = 'Same update_time, later export'
+    archive_path = str(tmp_path / 'merged.txt')
+
+    assert main(['merge', write_export(conversations, 'first.json'),
+                 write_export(renamed, 'second.json'), '-a', archive_path]) == 0
+
+    index = ArchiveIndex.load(archive_path, log=_quiet)
+    assert all(b'Same update_time, later export' in index.read_entry(cid) for cid in conversations)
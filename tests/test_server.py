@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from archive_index import INDEX_SUFFIX
+from archive_server import ArchiveStore, LRUCache, QueryServer
+from conftest import make_conversations
+from extractor import main, parse_time_arg, write_archive
+
+
+def _quiet(message):
+    pass
+
+
+@pytest.fixture
+def conversations():
+    return make_conversations(4)
+
+
+@pytest.fixture
+def server(tmp_path, conversations):
+    archive_path = str(tmp_path / 'archive.txt')
+    write_archive(conversations, archive_path, log=_quiet)
+    os.remove(archive_path + INDEX_SUFFIX)
+
+    server = QueryServer(('127.0.0.1', 0), ArchiveStore(archive_path, log=_quiet), LRUCache(),
+                         parse_time_arg, log=_quiet)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    # Serving is read-only: the index rebuilt in memory is never saved
+    assert not os.path.exists(archive_path + INDEX_SUFFIX)
+
+
+def _get(server, path):
+    """(status, body bytes) of a GET request to server"""
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_summary_and_listing(server, conversations):
+    status, body = _get(server, '/')
+    assert status == 200
+    assert json.loads(body)['conversations'] == len(conversations)
+
+    status, body = _get(server, '/conversations?limit=2')
+    listing = json.loads(body)
+    newest = sorted(conversations, key=lambda cid: conversations[cid]['create_time'], reverse=True)
+    assert listing['total'] == len(conversations)
+    assert [item['id'] for item in listing['conversations']] == newest[:2]
+
+    title = conversations[newest[-1]]['title']
+    status, body = _get(server, '/conversations?title=' + urllib.request.quote(title))
+    assert [item['id'] for item in json.loads(body)['conversations']] == [newest[-1]]
+
+
+def test_fetch_and_search(server, conversations):
+    conversation_id, conversation = next(iter(conversations.items()))
+    status, body = _get(server, f'/conversations/{conversation_id}')
+    assert status == 200
+    assert conversation['title'].encode('utf-8') in body
+    assert b'Checksum:' not in body
+
+    status, body = _get(server, '/search?q=' + urllib.request.quote(conversation['title']))
+    assert [result['id'] for result in json.loads(body)['results']] == [conversation_id]
+
+
+def test_errors(server):
+    assert _get(server, '/conversations/no-such-id')[0] == 404
+    assert _get(server, '/nowhere')[0] == 404
+    assert _get(server, '/conversations?since=not-a-date')[0] == 400
+    assert _get(server, '/search')[0] == 400
+
+
+def test_serve_refuses_unindexed_directory(tmp_path, capsys):
+    loose = tmp_path / 'loose'
+    loose.mkdir()
+    (loose / 'notes.txt').write_text('not an archive')
+    assert main(['serve', str(loose)]) == 1
+    assert 'neither a sharded archive' in capsys.readouterr().out
@@ -0,0 +1,78 @@
+import copy
+import os
+from datetime import datetime
+
+import pytest
+
+from archive_index import ArchiveIndex, list_shards, shard_location
+from conftest import make_conversations
+from extractor import UNDATED_NAME, main, parse_shard_arg, write_archive
+
+
+def _quiet(message):
+    pass
+
+
+def _shard_ids(directory):
+    """{shard name: set of IDs} of a sharded archive directory"""
+    return {os.path.basename(path).split('.')[0]: ArchiveIndex.load(path, log=_quiet).ids()
+            for path in list_shards(directory)}
+
+
+def test_parse_shard_arg():
+    assert parse_shard_arg(' Month ') == 'month'
+    assert parse_shard_arg('year') == 'year'
+    assert parse_shard_arg('5') == 5 << 20
+    assert parse_shard_arg('12mb') == 12 << 20
+    for value in ('0', 'week', '1gb'):
+        with pytest.raises(ValueError):
+            parse_shard_arg(value)
+
+
+def test_shard_location_keeps_extensions():
+    assert shard_location('out/chatgpt_archive.txt.gz') == ('out/chatgpt_archive', '.txt.gz')
+    assert shard_location('out/chatgpt_archive') == ('out/chatgpt_archive', '.txt')
+
+
+def test_period_shards_route_by_create_time(tmp_path):
+    conversations = make_conversations(6)
+    ids = list(conversations)
+    conversations[ids[0]]['create_time'] = None
+    archive_path = str(tmp_path / 'archive.txt')
+
+    write_archive(conversations, archive_path, log=_quiet, shard='month')
+
+    expected = {}
+    for cid, conversation in conversations.items():
+        create_time = conversation['create_time']
+        name = datetime.fromtimestamp(create_time).strftime('%Y-%m') if create_time else UNDATED_NAME
+        expected.setdefault(name, set()).add(cid)
+    assert _shard_ids(str(tmp_path / 'archive')) == expected
+
+
+def test_size_shards_roll_over_and_keep_existing_ids(tmp_path, write_export):
+    conversations = make_conversations(12)
+    archive_path = str(tmp_path / 'archive.txt')
+    directory = str(tmp_path / 'archive')
+
+    write_archive(conversations, archive_path, log=_quiet, shard=2000)
+    before = _shard_ids(directory)
+    assert len(before) > 1
+    assert all(name.startswith('part-') for name in before)
+    assert set().union(*before.values()) == set(conversations)
+
+    # An updated conversation stays in the part that holds it; new ones go to the last part
+    updated = copy.deepcopy(conversations)
+    first_part = min(before)
+    changed = next(iter(before[first_part]))
+    updated[changed]['title'] = 'Changed later'
+    updated[changed]['update_time'] += 100
+    updated.update(make_conversations(2, start=100))
+    assert main([write_export(updated), '-a', archive_path, '--shard', '1', '--update']) == 0
+
+    after = _shard_ids(directory)
+    assert changed in after[first_part]
+    assert sum(changed in ids for ids in after.values()) == 1
+    assert set().union(*after.values()) == set(updated)
+    assert b'Changed later' in ArchiveIndex.load(
+        os.path.join(directory, first_part + '.txt'), log=_quiet).read_entry(changed)